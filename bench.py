@@ -0,0 +1,187 @@
+import argparse
+import platform
+import random
+import subprocess
+import sys
+import time
+from json import loads, dumps
+
+from scheduler import (ScheduleSolver, CourseCatalog, parse_course_page, parse_time_pattern,
+                       cell_mask, course_reference, DAYS, PERIODS, SCORE_WEIGHTS)
+
+DAY_NAMES = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+WEEK_PATTERNS = ["1-16", "1-16", "单1-15", "双2-16", "1-8", "9-16"]
+
+# (名称, 课程组数, 每组班级数, 每个班级的上课次数, 锁定单元格比例)
+SUITE = [
+    ("small", 6, 4, 1, 0.0),
+    ("medium", 8, 6, 1, 0.0),
+    ("large", 10, 8, 1, 0.0),
+    ("dense", 10, 8, 3, 0.0),
+    ("locked", 10, 8, 1, 0.3),
+    ("worst", 12, 10, 1, 0.0),
+]
+
+
+def synthetic_kxrw(groups, sections, meetings, rnd):
+    items = []
+    for group in range(groups):
+        for section in range(sections):
+            times = "".join(
+                f"<p>{rnd.choice(WEEK_PATTERNS)}周,{rnd.choice(DAY_NAMES[:5])}"
+                f"第{(start := rnd.randrange(0, PERIODS - 1, 2) + 1)}-{start + 1}节</p>"
+                for _ in range(meetings)
+            )
+            items.append({"kcmc": f"课程{group:02d}", "dgjsmc": f"教师{section % 4}", "kcxx": times})
+    return {"list": items}
+
+
+def synthetic_locks(density, rnd):
+    locked = 0
+    for day in range(DAYS):
+        for period in range(PERIODS):
+            if rnd.random() < density:
+                locked |= cell_mask(day, period)
+    return locked
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def run_case(name, groups, sections, meetings, lock_density, limit, seed):
+    rnd = random.Random(seed)
+    kxrw_list = synthetic_kxrw(groups, sections, meetings, rnd)
+    locked = synthetic_locks(lock_density, rnd)
+
+    parse_time_pattern.cache_clear()
+    courses, parse_seconds = timed(lambda: parse_course_page(kxrw_list, next(iter(course_reference))))
+    solver, prepare_seconds = timed(lambda: ScheduleSolver.from_courses(courses, locked))
+    _, max_courses_seconds = timed(ScheduleSolver.from_courses(courses, locked).max_courses)
+    (max_courses, total, variants), count_seconds = timed(solver.count_schedules)
+
+    start = time.perf_counter()
+    schedules = solver.iter_schedules(max_courses)
+    first = next(schedules, None)
+    first_seconds = time.perf_counter() - start
+    enumerated = 1 if first is not None else 0
+    for _ in schedules:
+        enumerated += 1
+        if enumerated >= limit:
+            break
+    enumerate_seconds = time.perf_counter() - start
+    
+    ranker = ScheduleSolver.from_courses(courses, locked)
+    _, rank_seconds = timed(lambda: ranker.top_schedules(max_courses, 10, SCORE_WEIGHTS))
+
+    return {
+        "name": name,
+        "groups": groups,
+        "sections": sections,
+        "meetings": meetings,
+        "lock_density": lock_density,
+        "max_courses": max_courses,
+        "schedules": total,
+        "teacher_variants": variants,
+        "enumerated": enumerated,
+        "complete": enumerated >= total,
+        "nodes": solver.nodes,
+        "seconds": {
+            "parse": parse_seconds,
+            "prepare": prepare_seconds,
+            "max_courses": max_courses_seconds,
+            "count": count_seconds,
+            "first_result": first_seconds,
+            "enumerate": enumerate_seconds,
+            "rank_top10": rank_seconds,
+        },
+    }
+
+
+def run_available_query(catalog_size, queries, seed):
+    rnd = random.Random(seed)
+    kxrw_list = synthetic_kxrw(catalog_size // 5, 5, 2, rnd)
+    courses = parse_course_page(kxrw_list, next(iter(course_reference)))
+    catalog, build_seconds = timed(lambda: CourseCatalog(courses))
+    occupied = synthetic_locks(0.15, rnd)
+    timings = []
+    for query in queries:
+        _, seconds = timed(lambda: catalog.available(occupied, query))
+        timings.append(seconds)
+    return {
+        "name": "available_query",
+        "catalog_size": len(courses),
+        "seconds": {
+            "build_catalog": build_seconds,
+            "query_mean": sum(timings) / len(timings),
+            "query_max": max(timings),
+        },
+    }
+
+
+def best_of(repeat, func):
+    runs = [func() for _ in range(repeat)]
+    best = runs[0]
+    for key in best["seconds"]:
+        best["seconds"][key] = min(run["seconds"][key] for run in runs)
+    return best
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def print_report(results, baseline=None):
+    baseline_cases = {case["name"]: case for case in (baseline or {}).get("cases", [])}
+    for case in results["cases"]:
+        old = baseline_cases.get(case["name"], {}).get("seconds", {})
+        parts = []
+        for key, seconds in case["seconds"].items():
+            part = f"{key}={seconds * 1000:.2f}ms"
+            if old.get(key):
+                part += f"({seconds / old[key]:.2f}x)"
+            parts.append(part)
+        print(f"{case['name']:<16}" + "  ".join(parts))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="排课求解器性能测试")
+    parser.add_argument("--output", default="bench_results.json", help="结果 JSON 文件")
+    parser.add_argument("--compare", metavar="JSON", help="与之前保存的结果对比")
+    parser.add_argument("--cases", nargs="*", help="只运行指定名称的用例")
+    parser.add_argument("--limit", type=int, default=200000, help="每个用例最多枚举的课程表数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例重复次数，取最快一次")
+    parser.add_argument("--catalog-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cases = []
+    for name, groups, sections, meetings, lock_density in SUITE:
+        if args.cases and name not in args.cases:
+            continue
+        cases.append(best_of(args.repeat, lambda: run_case(
+            name, groups, sections, meetings, lock_density, args.limit, args.seed)))
+    if not args.cases or "available_query" in args.cases:
+        cases.append(best_of(args.repeat, lambda: run_available_query(
+            args.catalog_size, ["", "课程0", "教师1", "星期三", "单"], args.seed)))
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cases": cases,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = loads(f.read())
+    print_report(results, baseline)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(dumps(results, ensure_ascii=False, indent=1))
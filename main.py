@@ -1,52 +1,139 @@
-import numpy as np
 from collections import defaultdict
+from itertools import islice
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout,
                            QLineEdit, QPushButton, QLabel, QFrame, QScrollArea, QGroupBox,
                            QTextEdit, QMessageBox, QTableWidget, QTableWidgetItem, QHeaderView,
-                           QListWidget, QListWidgetItem, QDialog, QDialogButtonBox)
-from PyQt5.QtCore import Qt, pyqtSignal
+                           QListView, QDialog, QDialogButtonBox, QSpinBox, QCheckBox)
+from PyQt5.QtCore import Qt, pyqtSignal, QObject, QThread, QTimer, QAbstractListModel, QModelIndex
 from PyQt5.QtGui import QFont, QColor, QBrush
 import requests
+from requests.adapters import HTTPAdapter
 import os
 import sys
-import getpass
-import re
+import argparse
+import time
+import threading
+import cProfile
 from re import findall
 from json import loads
-import pandas as pd
+from urllib.parse import quote
 from datetime import datetime
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtWidgets import QFileDialog
 from urllib3.exceptions import InsecureRequestWarning
+from scheduler import (course_reference, CourseCatalog, ScheduleSolver, ScheduleSession, cell_bit, cell_mask,
+                       week_projection, schedule_cells, schedule_view, cell_label, parse_course_page,
+                       schedule_features, schedule_score, SCORE_WEIGHTS,
+                       save_fixture, load_fixture, save_catalog_cache, load_catalog_cache,
+                       latest_cache_path, metrics, SESSION_LIMIT)
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-course_reference = {
-    "bxxk": "通识必修选课",
-    "xxxk": "通识选修选课",
-    "kzyxk": "培养方案内选课",
-    "zynknjxk": "非培养方案内选课",
-    "jhnxk": "重修选课"
+SCHEDULE_PAGE_SIZE = 100
+RANKED_SCHEDULES = 100  # 按偏好排序且不限数量时保留的课程表数量
+SCORE_LABELS = {"early": "早课(第1-2节)", "days": "在校天数", "gaps": "空档", "late": "晚课(第9-11节)"}
+SEARCH_DEBOUNCE_MS = 200
+CELL_COLORS = {"empty": (255, 255, 255), "locked": (255, 200, 200), "course": (200, 255, 200), "conflict": (255, 220, 200)}
+CATALOG_PAGE_SIZE = 1000
+FETCH_WORKERS = 8
+CAS_URL = os.environ.get("SUSTECH_CAS_URL", "https://cas.sustech.edu.cn")
+TIS_URL = os.environ.get("SUSTECH_TIS_URL", "https://tis.sustech.edu.cn")
+HEADER = {
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.0.0 Safari/537.36",
+    "x-requested-with": "XMLHttpRequest"
 }
+profiler = None  # --profile 时为 cProfile.Profile，只在后台搜索课程表时启用
 def warn(message, category, filename, lineno, file=None, line=None):
     if category is not InsecureRequestWarning:
         sys.stderr.write(warnings.formatwarning(message, category, filename, lineno, line))
 warnings.showwarning = warn
 
+class SectionListModel(QAbstractListModel):
+    # 每行只保存课程班级在 courses 中的下标，文字在视图绘制到这一行时才生成
+    def __init__(self, courses, format_row):
+        super().__init__()
+        self.courses = courses
+        self.format_row = format_row
+        self.rows = []
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.format_row(self.courses[self.rows[index.row()]])
+        if role == Qt.UserRole:
+            return self.rows[index.row()]
+        return None
+    
+    def set_rows(self, rows, courses=None):
+        self.beginResetModel()
+        if courses is not None:
+            self.courses = courses
+        self.rows = list(rows)
+        self.endResetModel()
+    
+    def append_row(self, section_id):
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows))
+        self.rows.append(section_id)
+        self.endInsertRows()
+    
+    def remove_rows(self, positions):
+        for row in sorted(positions, reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.rows[row]
+            self.endRemoveRows()
+    
+    def section_courses(self):
+        return [self.courses[i] for i in self.rows]
+
+def create_section_list(courses, format_row, multi_selection=False):
+    view = QListView()
+    view.setModel(SectionListModel(courses, format_row))
+    view.setUniformItemSizes(True)
+    if multi_selection:
+        view.setSelectionMode(QListView.MultiSelection)
+    return view
+
+def selected_rows(view):
+    return sorted(index.row() for index in view.selectionModel().selectedRows())
+
 class CourseSchedulerApp(QMainWindow):
-    def __init__(self, course_list):
+    def __init__(self, course_list=None, record_path=None):
         super().__init__()
         self.setWindowTitle("课程表管理系统")
         self.setGeometry(100, 100, 1800, 800)
-        self.course_list = course_list
+        self.course_list = []
+        self.catalog = CourseCatalog([])
+        self.catalog_loader = None
+        self.record_path = record_path
         self.filtered_courses = []
         self.schedules = []
+        self.schedule_worker = None
+        self.max_courses = 0
+        self.total_schedules = 0
+        self.total_variants = 0
         self.current_schedule_idx = -1
-        self.locked_time_slots = np.zeros((16, 7, 11), dtype=bool)
+        self.locked_time_slots = 0
+        self.ranked = False
+        self.count_only = False
+        self.live = False
+        self.cell_view = {}
+        self.cell_state = {}
+        self.cell_brushes = {name: QBrush(QColor(*rgb)) for name, rgb in CELL_COLORS.items()}
+        # 生成或统计过一次后，锁定时间和所选课程的变化会自动按同样的方式重新求解
+        self.auto_count_only = None
+        self.session = ScheduleSession()
         
         self.init_ui()
+        if course_list is not None:
+            self.set_catalog(course_list)
+        else:
+            self.set_catalog_widgets_enabled(False)
+            self.statusBar().showMessage("正在加载课程数据...")
         
         self.show()
         self.setWindowState(self.windowState() & ~Qt.WindowMinimized | Qt.WindowActive)
@@ -74,10 +161,11 @@ class CourseSchedulerApp(QMainWindow):
         self.search_input.setPlaceholderText("输入课程关键词")
         self.search_btn = QPushButton("搜索")
         
-        self.search_result_list = QListWidget()
-        self.search_result_list.setSelectionMode(QListWidget.MultiSelection)
+        # 搜索结果每个课程名称一行，保存该课程第一个班级的下标
+        self.search_result_list = create_section_list(self.course_list, lambda c: c[0], True)
         
-        self.selected_courses_list = QListWidget()
+        self.selected_courses_list = create_section_list(
+            self.course_list, lambda c: f"{c[0]} ({c[1]})\n时间: {c[3]}", True)
         
         btn_frame = QFrame()
         btn_layout = QHBoxLayout(btn_frame)
@@ -111,11 +199,54 @@ class CourseSchedulerApp(QMainWindow):
         self.export_btn.setEnabled(False)
         generate_layout.addWidget(self.export_btn)
         
+        generate_frame = QFrame()
+        generate_btn_layout = QHBoxLayout(generate_frame)
         self.generate_btn = QPushButton("生成所有可能的课程表")
-        generate_layout.addWidget(self.generate_btn)
+        self.cancel_generate_btn = QPushButton("取消生成")
+        self.cancel_generate_btn.setEnabled(False)
+        self.count_btn = QPushButton("仅统计数量")
+        generate_btn_layout.addWidget(self.generate_btn)
+        generate_btn_layout.addWidget(self.count_btn)
+        generate_btn_layout.addWidget(self.cancel_generate_btn)
+        generate_layout.addWidget(generate_frame)
         
         self.schedule_count_label = QLabel("找到 0 个有效课程表")
         generate_layout.addWidget(self.schedule_count_label)
+        self.search_progress_label = QLabel("")
+        generate_layout.addWidget(self.search_progress_label)
+        
+        limit_frame = QFrame()
+        limit_layout = QHBoxLayout(limit_frame)
+        self.schedule_limit_input = QSpinBox()
+        self.schedule_limit_input.setRange(0, 1000000)
+        self.schedule_limit_input.setSingleStep(1000)
+        self.schedule_limit_input.setSpecialValueText("不限")
+        self.background_count_check = QCheckBox("后台统计全部课程表")
+        self.parallel_check = QCheckBox("多核并行搜索")
+        limit_layout.addWidget(QLabel("最多生成:"))
+        limit_layout.addWidget(self.schedule_limit_input)
+        limit_layout.addWidget(self.background_count_check)
+        limit_layout.addWidget(self.parallel_check)
+        generate_layout.addWidget(limit_frame)
+        
+        rank_frame = QFrame()
+        rank_layout = QHBoxLayout(rank_frame)
+        self.rank_check = QCheckBox("按偏好排序")
+        self.rank_check.setToolTip("只保留得分最低的课程表（数量为“最多生成”，不限时为 "
+                                   f"{RANKED_SCHEDULES} 个），得分为各项整学期课时数或天数乘以权重之和")
+        rank_layout.addWidget(self.rank_check)
+        self.weight_inputs = {}
+        for name, label in SCORE_LABELS.items():
+            weight_input = QSpinBox()
+            weight_input.setRange(0, 10)
+            weight_input.setValue(SCORE_WEIGHTS[name])
+            weight_input.valueChanged.connect(self.update_schedule_score)
+            rank_layout.addWidget(QLabel(f"{label}:"))
+            rank_layout.addWidget(weight_input)
+            self.weight_inputs[name] = weight_input
+        generate_layout.addWidget(rank_frame)
+        self.schedule_score_label = QLabel("")
+        generate_layout.addWidget(self.schedule_score_label)
         
         nav_frame = QFrame()
         nav_layout = QHBoxLayout(nav_frame)
@@ -149,6 +280,15 @@ class CourseSchedulerApp(QMainWindow):
         self.schedule_table.setRowCount(11)
         self.schedule_table.setVerticalHeaderLabels([f"第{i+1}节" for i in range(11)])
         self.schedule_table.verticalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # 单元格只由程序更新，update_table_appearance 按记录的显示状态做增量修改
+        self.schedule_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        for day in range(7):
+            for time in range(11):
+                item = QTableWidgetItem()
+                item.setTextAlignment(Qt.AlignCenter)
+                item.setBackground(self.cell_brushes["empty"])
+                self.schedule_table.setItem(time, day, item)
+                self.cell_state[day, time] = ("", "empty")
         
         self.schedule_table.cellDoubleClicked.connect(self.toggle_time_slot_lock)
         
@@ -170,7 +310,8 @@ class CourseSchedulerApp(QMainWindow):
         self.available_search_btn = QPushButton("查询可用课程")
         available_layout.addWidget(self.available_search_btn)
         
-        self.available_courses_list = QListWidget()
+        self.available_courses_list = create_section_list(
+            self.course_list, lambda c: f"{c[0]} - {c[1]}\n时间: {c[3]}")
         available_layout.addWidget(self.available_courses_list)
         
         self.add_to_schedule_btn = QPushButton("加入当前课表")
@@ -187,6 +328,8 @@ class CourseSchedulerApp(QMainWindow):
         self.remove_selected_btn.clicked.connect(self.remove_selected_courses)
         self.clear_selected_btn.clicked.connect(self.clear_selected_courses)
         self.generate_btn.clicked.connect(self.generate_schedules)
+        self.count_btn.clicked.connect(self.count_schedules)
+        self.cancel_generate_btn.clicked.connect(self.cancel_generation)
         self.prev_btn.clicked.connect(self.show_prev_schedule)
         self.next_btn.clicked.connect(self.show_next_schedule)
         self.available_search_btn.clicked.connect(self.search_available_courses)
@@ -194,37 +337,157 @@ class CourseSchedulerApp(QMainWindow):
         self.export_btn.clicked.connect(self.export_to_excel)
         self.clear_locks_btn.clicked.connect(self.clear_all_locks)
         self.show_locks_btn.clicked.connect(self.show_locked_time_slots)
+        self.background_count_check.toggled.connect(self.toggle_background_count)
+        
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.live_search_courses)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        
+        self.available_search_timer = QTimer(self)
+        self.available_search_timer.setSingleShot(True)
+        self.available_search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.available_search_timer.timeout.connect(self.live_search_available_courses)
+        self.available_search_input.textChanged.connect(self.available_search_timer.start)
+        
+        self.resolve_timer = QTimer(self)
+        self.resolve_timer.setSingleShot(True)
+        self.resolve_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.resolve_timer.timeout.connect(self.live_resolve)
+        
+        self.login_btn = QPushButton("登录并重新下载课程数据")
+        self.login_btn.clicked.connect(lambda: self.show_login_dialog())
+        self.statusBar().addPermanentWidget(self.login_btn)
+    
+    def set_catalog_widgets_enabled(self, enabled):
+        for widget in (self.search_input, self.search_btn, self.add_selected_btn,
+                       self.available_search_input, self.available_search_btn, self.add_to_schedule_btn):
+            widget.setEnabled(enabled)
+    
+    def set_catalog(self, course_list, catalog=None):
+        if catalog is None:
+            with metrics.timer("catalog.index"):
+                catalog = CourseCatalog(course_list)
+        # 已选课程按 (名称, 教师, 上课时间) 换成新课程数据中的下标，新数据中没有的班级会被移除
+        section_ids = {(c[0], c[1], c[2]): i for i, c in enumerate(course_list)}
+        selected_ids = [section_ids.get((c[0], c[1], c[2])) for c in self.filtered_courses]
+        self.course_list = course_list
+        self.catalog = catalog
+        self.search_result_list.model().set_rows([], course_list)
+        self.available_courses_list.model().set_rows([], course_list)
+        self.selected_courses_list.model().set_rows([i for i in selected_ids if i is not None], course_list)
+        self.filtered_courses = self.selected_courses_list.model().section_courses()
+        self.update_selected_count()
+        self.set_catalog_widgets_enabled(True)
+        self.statusBar().showMessage(f"已加载 {len(course_list)} 个课程班级")
+        if self.search_input.text().strip():
+            self.live_search_courses()
+    
+    def load_catalog(self, load):
+        self.login_btn.setEnabled(False)
+        loader = CatalogLoader(load)
+        loader.status.connect(self.statusBar().showMessage)
+        loader.loaded.connect(self.on_catalog_loaded)
+        loader.failed.connect(self.on_catalog_failed)
+        self.catalog_loader = loader
+        loader.start()
+    
+    def on_catalog_loaded(self, course_list, catalog):
+        if self.sender() is not self.catalog_loader:
+            return
+        self.catalog_loader = None
+        self.login_btn.setEnabled(True)
+        if course_list is None:
+            self.show_login_dialog()
+        else:
+            self.set_catalog(course_list, catalog)
+    
+    def on_catalog_failed(self, message):
+        if self.sender() is not self.catalog_loader:
+            return
+        self.catalog_loader = None
+        self.login_btn.setEnabled(True)
+        self.statusBar().showMessage(message)
+        self.show_login_dialog(message)
+    
+    def show_login_dialog(self, message=""):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("登录tis")
+        dialog.setMinimumWidth(360)
+        
+        layout = QVBoxLayout()
+        user_input = QLineEdit()
+        user_input.setPlaceholderText("tis账号")
+        pwd_input = QLineEdit()
+        pwd_input.setPlaceholderText("tis密码")
+        pwd_input.setEchoMode(QLineEdit.Password)
+        
+        btn_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        btn_box.accepted.connect(dialog.accept)
+        btn_box.rejected.connect(dialog.reject)
+        if latest_cache_path():
+            cache_btn = btn_box.addButton("使用本地缓存(可能已过期)", QDialogButtonBox.ActionRole)
+            cache_btn.clicked.connect(lambda: dialog.done(2))
+        
+        layout.addWidget(QLabel(message or "请登录tis以下载课程数据"))
+        layout.addWidget(user_input)
+        layout.addWidget(pwd_input)
+        layout.addWidget(btn_box)
+        dialog.setLayout(layout)
+        
+        result = dialog.exec_()
+        if result == QDialog.Accepted:
+            user_name, pwd = user_input.text().strip(), pwd_input.text()
+            self.load_catalog(lambda on_status: download_catalog(user_name, pwd, self.record_path, on_status))
+        elif result == 2:
+            self.load_catalog(lambda on_status: load_catalog_cache(ttl=None))
+        elif not self.course_list:
+            self.statusBar().showMessage("未加载课程数据")
     
     def toggle_time_slot_lock(self, row, column):
         day_names = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
         time_slot = f"第{row+1}节"
         day_name = day_names[column]
-        is_currently_locked = np.any(self.locked_time_slots[:, column, row])
+        is_currently_locked = self.locked_time_slots & cell_mask(column, row)
         if is_currently_locked:
-            for week in range(16):
-                self.locked_time_slots[week, column, row] = False
+            self.locked_time_slots &= ~cell_mask(column, row)
             self.update_table_appearance()
+            self.schedule_live_resolve()
             QMessageBox.information(self, "时间段解锁", f"已解锁 {day_name} {time_slot}")
         else:
-            for week in range(16):
-                self.locked_time_slots[week, column, row] = True
+            self.locked_time_slots |= cell_mask(column, row)
             self.update_table_appearance()
+            self.schedule_live_resolve()
             QMessageBox.information(self, "时间段锁定", f"已锁定 {day_name} {time_slot}")
     
     def update_table_appearance(self):
-        for day in range(7):
-            for time in range(11):
-                item = self.schedule_table.item(time, day)
-                if item is None:
-                    item = QTableWidgetItem()
-                    self.schedule_table.setItem(time, day, item)
-                
-                if np.any(self.locked_time_slots[:, day, time]):
-                    item.setBackground(QBrush(QColor(255, 200, 200)))
-                    item.setToolTip("该时间段已被锁定")
-                else:
-                    item.setBackground(QBrush(QColor(255, 255, 255)))  
-                    item.setToolTip("")
+        # 只改动和当前显示不同的单元格，整批改完后再重绘
+        locked_cells = week_projection(self.locked_time_slots)
+        self.schedule_table.setUpdatesEnabled(False)
+        try:
+            for day in range(7):
+                for time in range(11):
+                    text, conflict = self.cell_view.get((day, time), ("", False))
+                    if text:
+                        color = "conflict" if conflict else "course"
+                    elif locked_cells & cell_bit(day, time):
+                        color = "locked"
+                    else:
+                        color = "empty"
+                    
+                    old_text, old_color = self.cell_state[day, time]
+                    if (text, color) == (old_text, old_color):
+                        continue
+                    item = self.schedule_table.item(time, day)
+                    if text != old_text:
+                        item.setText(text)
+                    if color != old_color:
+                        item.setBackground(self.cell_brushes[color])
+                        item.setToolTip("该时间段已被锁定" if color == "locked" else "")
+                    self.cell_state[day, time] = (text, color)
+        finally:
+            self.schedule_table.setUpdatesEnabled(True)
     
     def clear_all_locks(self):
         reply = QMessageBox.question(
@@ -235,17 +498,19 @@ class CourseSchedulerApp(QMainWindow):
         )
         
         if reply == QMessageBox.Yes:
-            self.locked_time_slots = np.zeros((16, 7, 11), dtype=bool)
+            self.locked_time_slots = 0
             self.update_table_appearance()
+            self.schedule_live_resolve()
             QMessageBox.information(self, "成功", "已清除所有时间锁定")
     
     def show_locked_time_slots(self):
         locked_slots = []
         day_names = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+        locked_cells = week_projection(self.locked_time_slots)
         
         for day in range(7):
             for time in range(11):
-                if np.any(self.locked_time_slots[:, day, time]):
+                if locked_cells & cell_bit(day, time):
                     locked_slots.append(f"{day_names[day]} 第{time+1}节")
         
         if not locked_slots:
@@ -260,76 +525,67 @@ class CourseSchedulerApp(QMainWindow):
             QMessageBox.warning(self, "提示", "请输入搜索关键词")
             return
         
-        self.search_result_list.clear()
-        
-        matched_courses = set()
-        for course in self.course_list:
-            if keyword.lower() in course[0].lower():
-                matched_courses.add(course[0])
-        
-        if not matched_courses:
+        if not self.fill_search_results(keyword):
             QMessageBox.information(self, "提示", f"未找到包含'{keyword}'的课程")
-            return
-        
-        for course_name in sorted(matched_courses):
-            self.search_result_list.addItem(course_name)
+    
+    def live_search_courses(self):
+        keyword = self.search_input.text().strip()
+        if keyword:
+            self.fill_search_results(keyword)
+        else:
+            self.search_result_list.model().set_rows([])
+    
+    def fill_search_results(self, keyword):
+        matched_courses = self.catalog.search_names(keyword)
+        self.search_result_list.model().set_rows(
+            self.catalog.sections_by_name[name][0] for name in matched_courses)
+        return bool(matched_courses)
     
     def add_selected_courses(self):
-        selected_items = self.search_result_list.selectedItems()
-        if not selected_items:
+        model = self.search_result_list.model()
+        rows = selected_rows(self.search_result_list)
+        if not rows:
             QMessageBox.warning(self, "提示", "请先在搜索结果中选择课程")
             return
         
-        for item in selected_items:
-            course_name = item.text()
-            courses = [c for c in self.course_list if c[0] == course_name]
+        for row in rows:
+            course_name = self.course_list[model.rows[row]][0]
+            section_ids = self.catalog.sections_by_name[course_name]
             
-            if len(courses) == 1:
-                self.add_course_to_selected(courses[0])
+            if len(section_ids) == 1:
+                self.add_course_to_selected(section_ids[0])
             else:
-                self.show_course_selection_dialog(course_name, courses)
+                self.show_course_selection_dialog(course_name, section_ids)
 
     def remove_selected_courses(self):
-        selected_items = self.selected_courses_list.selectedItems()
-        if not selected_items:
+        rows = selected_rows(self.selected_courses_list)
+        if not rows:
             QMessageBox.warning(self, "提示", "请先选择要移除的课程")
             return
         
         reply = QMessageBox.question(
             self, 
             "确认移除",
-            f"确定要移除这 {len(selected_items)} 门课程吗？",
+            f"确定要移除这 {len(rows)} 门课程吗？",
             QMessageBox.Yes | QMessageBox.No
         )
         
         if reply == QMessageBox.Yes:
-            for item in selected_items:
-                course = item.data(Qt.UserRole)
-                row = self.selected_courses_list.row(item)
-                self.selected_courses_list.takeItem(row)
-                
-                for i, c in enumerate(self.filtered_courses):
-                    if (c[0] == course[0] and 
-                        c[1] == course[1] and 
-                        np.array_equal(c[2], course[2])):
-                        self.filtered_courses.pop(i)
-                        break
-    
-    def show_course_selection_dialog(self, course_name, courses):
+            model = self.selected_courses_list.model()
+            model.remove_rows(rows)
+            self.filtered_courses = model.section_courses()
+            self.update_selected_count()
+            self.schedule_live_resolve()
+    
+    def show_course_selection_dialog(self, course_name, section_ids):
         dialog = QDialog(self)
         dialog.setWindowTitle(f"选择 {course_name} 纳入考虑的课程")
         dialog.setMinimumWidth(500) 
         
         layout = QVBoxLayout()
 
-        list_widget = QListWidget()
-        for course in courses:
-            item_text = f"{course[1]}\n时间: {course[3]}" 
-            item = QListWidgetItem(item_text)
-            item.setData(Qt.UserRole, course)
-            list_widget.addItem(item)
-        
-        list_widget.setSelectionMode(QListWidget.MultiSelection)
+        list_widget = create_section_list(self.course_list, lambda c: f"{c[1]}\n时间: {c[3]}", True)
+        list_widget.model().set_rows(section_ids)
         
         btn_frame_top = QFrame()
         btn_layout_top = QHBoxLayout(btn_frame_top)
@@ -355,33 +611,28 @@ class CourseSchedulerApp(QMainWindow):
         dialog.setLayout(layout)
         
         if dialog.exec_() == QDialog.Accepted:
-            for item in list_widget.selectedItems():
-                course = item.data(Qt.UserRole)
-                self.add_course_to_selected(course)
+            for row in selected_rows(list_widget):
+                self.add_course_to_selected(section_ids[row])
     
-    def add_course_to_selected(self, course):
-        if np.any(np.logical_and(self.locked_time_slots, course[2])):
+    def add_course_to_selected(self, section_id):
+        course = self.course_list[section_id]
+        if self.locked_time_slots & course[2]:
             QMessageBox.warning(self, "时间冲突", 
                                f"课程 '{course[0]}' 与锁定的时间段冲突，无法添加")
             return
         
-        for i in range(self.selected_courses_list.count()):
-            existing_item = self.selected_courses_list.item(i)
-            existing_course = existing_item.data(Qt.UserRole)
+        for existing_course in self.filtered_courses:
             if (existing_course[0] == course[0] and 
                 existing_course[1] == course[1] and 
-                np.array_equal(existing_course[2], course[2])):
+                existing_course[2] == course[2]):
                 QMessageBox.warning(self, "提示", "该课程已添加")
                 return
         
-        item_text = f"{course[0]} ({course[1]})\n时间: {course[3]}"
-        item = QListWidgetItem(item_text)
-        item.setData(Qt.UserRole, course)
-        self.selected_courses_list.addItem(item)
-        
+        self.selected_courses_list.model().append_row(section_id)
         self.filtered_courses.append(course)
         
         self.update_selected_count()
+        self.schedule_live_resolve()
 
     def update_selected_count(self):
         unique_course_names = set()
@@ -391,136 +642,185 @@ class CourseSchedulerApp(QMainWindow):
         count = len(unique_course_names)
         self.selected_courses_list.setToolTip(f"已选课程种类: {count}/12 种")
         if count >= 12:
-            self.selected_courses_list.setStyleSheet("QListWidget { border: 2px solid red; }")
+            self.selected_courses_list.setStyleSheet("QListView { border: 2px solid red; }")
         else:
             self.selected_courses_list.setStyleSheet("")
     
     def clear_selected_courses(self):
-        self.selected_courses_list.clear()
+        self.selected_courses_list.model().set_rows([])
         self.filtered_courses = []
+        self.update_selected_count()
+        self.auto_count_only = None
+        self.resolve_timer.stop()
     
     def generate_schedules(self):
+        self.auto_count_only = False
+        self.start_schedule_worker(count_only=False)
+    
+    def count_schedules(self):
+        self.auto_count_only = True
+        self.start_schedule_worker(count_only=True)
+    
+    def schedule_live_resolve(self):
+        if self.auto_count_only is not None:
+            self.resolve_timer.start()
+    
+    def live_resolve(self):
+        if self.auto_count_only is not None and self.filtered_courses:
+            self.start_schedule_worker(self.auto_count_only, live=True)
+    
+    def start_schedule_worker(self, count_only, live=False):
         if not self.filtered_courses:
             QMessageBox.warning(self, "警告", "请先添加课程")
             return
         
-        course_groups = defaultdict(list)
-        for course in self.filtered_courses:
-            course_groups[course[0]].append(course) 
-        
+        self.stop_schedule_worker()
         self.schedules = []
-        max_courses = 0
-        
-        def find_max_courses(group_keys, index, current_count, combined_schedule):
-            nonlocal max_courses
-            
-            if index >= len(group_keys):
-                if current_count > max_courses:
-                    max_courses = current_count
-                return
-            
-            find_max_courses(group_keys, index + 1, current_count, combined_schedule)
-            
-            current_group = course_groups[group_keys[index]]
-            for course in current_group:
-                if (not np.any(np.logical_and(combined_schedule[0], course[2][0])) and \
-                   not np.any(np.logical_and(self.locked_time_slots, course[2]))):
-                    new_schedule = np.logical_or(combined_schedule, course[2])
-                    find_max_courses(group_keys, index + 1, current_count + 1, new_schedule)
-        
-        group_keys = list(course_groups.keys())
-        find_max_courses(group_keys, 0, 0, np.zeros((16, 7, 11), dtype=bool))
-        
-        if max_courses == 0:
-            QMessageBox.warning(self, "提示", "没有找到有效的课程表组合（可能与锁定的时间段冲突）")
+        self.current_schedule_idx = -1
+        self.max_courses = 0
+        self.total_schedules = None
+        self.total_variants = None
+        self.pending_next = False
+        self.ranked = self.rank_check.isChecked() and not count_only
+        self.count_only = count_only
+        self.live = live
+        self.show_schedule(self.current_schedule_idx)
+        self.update_nav_buttons()
+        self.schedule_count_label.setText("正在统计课程表数量..." if count_only else "正在生成课程表...")
+        
+        worker = ScheduleWorker(self.filtered_courses, self.locked_time_slots,
+                                self.schedule_limit_input.value(),
+                                self.background_count_check.isChecked(),
+                                os.cpu_count() if self.parallel_check.isChecked() else 1,
+                                count_only,
+                                self.score_weights() if self.rank_check.isChecked() else None,
+                                self.session)
+        worker.progress.connect(self.on_schedule_progress)
+        worker.maximum.connect(self.on_max_courses)
+        worker.counted.connect(self.on_schedules_counted)
+        worker.schedules_found.connect(self.on_schedules_found)
+        worker.finished.connect(self.on_schedule_worker_finished)
+        self.schedule_worker = worker
+        self.cancel_generate_btn.setEnabled(True)
+        worker.start()
+    
+    def stop_schedule_worker(self):
+        if self.schedule_worker is not None:
+            self.schedule_worker.cancel()
+            self.schedule_worker.wait()
+            self.schedule_worker = None
+    
+    def cancel_generation(self):
+        if self.schedule_worker is not None:
+            self.schedule_worker.cancel()
+    
+    def closeEvent(self, event):
+        self.stop_schedule_worker()
+        super().closeEvent(event)
+    
+    def on_schedule_progress(self, nodes, found, best):
+        if self.sender() is not self.schedule_worker:
             return
+        self.search_progress_label.setText(
+            f"已探索 {nodes} 个分支，已找到 {found} 个课程表，当前最多 {best} 门课程")
+    
+    def on_max_courses(self, max_courses):
+        if self.sender() is not self.schedule_worker:
+            return
+        self.max_courses = max_courses
+        self.update_schedule_count()
+    
+    def on_schedules_counted(self, max_courses, total, variants):
+        if self.sender() is not self.schedule_worker:
+            return
+        self.max_courses = max_courses
+        self.total_schedules = total
+        self.total_variants = variants
+        self.update_schedule_count()
+    
+    def on_schedules_found(self, batch):
+        if self.sender() is not self.schedule_worker:
+            return
+        first = not self.schedules
+        self.schedules.extend(batch)
+        self.update_schedule_count()
         
-        current_schedule = []
-        combined_schedule = np.zeros((16, 7, 11), dtype=bool)
-        
-        def backtrack_maximal(group_keys, index):
-            nonlocal combined_schedule
-            
-            if len(current_schedule) == max_courses:
-                schedule_key = tuple(
-                    (c[0], c[1], tuple(zip(*np.where(c[2])))) 
-                    for c in sorted(current_schedule, key=lambda x: x[0])
-                )
-                if schedule_key not in self.schedules:
-                    self.schedules.append([course for course in current_schedule])
-                return
-            
-            if index >= len(group_keys):
-                return
-            
-            backtrack_maximal(group_keys, index + 1)
-            
-            current_group = course_groups[group_keys[index]]
-            for course in current_group:
-                if (not np.any(np.logical_and(combined_schedule[0], course[2][0])) and \
-                   not np.any(np.logical_and(self.locked_time_slots, course[2]))):
-                    current_schedule.append(course)
-                    old_schedule = combined_schedule.copy()
-                    combined_schedule = np.logical_or(combined_schedule, course[2])
-                    
-                    backtrack_maximal(group_keys, index + 1)
-                    
-                    current_schedule.pop()
-                    combined_schedule = old_schedule
-        
-        backtrack_maximal(group_keys, 0)
-        
-        self.schedule_count_label.setText(f"找到 {len(self.schedules)} 个包含 {max_courses} 门课程的有效课程表")
-        
-        if self.schedules:
+        if first:
             self.current_schedule_idx = 0
             self.show_schedule(self.current_schedule_idx)
             self.update_nav_buttons()
             
-            detail = f"找到 {len(self.schedules)} 个包含 {max_courses} 门课程的课程表:\n"
-            for i, course in enumerate(self.schedules[0]):
-                detail += f"{i+1}. {course[0]} ({course[1]})\n"
-            
-            QMessageBox.information(self, "提示", detail)
+            if not self.live:
+                detail = f"找到包含 {self.max_courses} 门课程的课程表，第一个课程表:\n"
+                for i, course in enumerate(self.schedules[0]):
+                    detail += f"{i+1}. {course[0]} ({course[1]})\n"
+                QMessageBox.information(self, "提示", detail)
+        elif self.pending_next:
+            self.pending_next = False
+            self.show_next_schedule()
         else:
+            self.update_nav_buttons()
+    
+    def on_schedule_worker_finished(self):
+        worker = self.sender()
+        if worker is not self.schedule_worker:
+            return
+        self.schedule_worker = None
+        self.pending_next = False
+        self.cancel_generate_btn.setEnabled(False)
+        self.search_progress_label.setText(
+            f"共探索 {worker.solver.nodes} 个分支" + ("（已取消）" if worker.cancelled else ""))
+        self.update_schedule_count(worker.cancelled)
+        self.update_nav_buttons()
+        
+        if not worker.cancelled and not self.live and self.max_courses == 0:
             QMessageBox.warning(self, "提示", "没有找到有效的课程表组合（可能与锁定的时间段冲突）")
     
-    def show_schedule(self, idx):
-        if 0 <= idx < len(self.schedules):
-            self.export_btn.setEnabled(True)
-            schedule = self.schedules[idx]
-            
-            weekly_schedule = defaultdict(lambda: defaultdict(list))
-            
-            for course in schedule:
-                for week in range(16):
-                    for day in range(7):
-                        for time in range(11):
-                            if course[2][week, day, time]:
-                                course_info = f"{course[0]}({course[1]})"
-                                weekly_schedule[day][time].append(course_info)
-            
-            self.schedule_table.clearContents()
-            for day in range(7):
-                for time in range(11):
-                    courses_in_slot = weekly_schedule[day][time]
-                    if courses_in_slot:
-                        item = QTableWidgetItem()
-                        item.setTextAlignment(Qt.AlignCenter)
-                        
-                        unique_courses = sorted(set(courses_in_slot))
-                        item.setText("\n".join(unique_courses))
-                        
-                        if len(unique_courses) > 1:
-                            item.setBackground(QBrush(QColor(255, 220, 200)))
-                        else:
-                            item.setBackground(QBrush(QColor(200, 255, 200))) 
-                        
-                        self.schedule_table.setItem(time, day, item)
-            
-            self.update_table_appearance()
+    def update_schedule_count(self, cancelled=False):
+        if self.total_schedules is None:
+            text = f"最多可选 {self.max_courses} 门课程" + ("" if cancelled else "，正在统计课程表数量...")
         else:
-            self.export_btn.setEnabled(False)
+            text = f"找到 {self.total_schedules} 个包含 {self.max_courses} 门课程的有效课程表"
+            if self.total_variants != self.total_schedules:
+                text += f"（按教师展开共 {self.total_variants} 种）"
+        if self.ranked and self.schedules:
+            text += f"，按偏好保留得分最低的 {len(self.schedules)} 个"
+        elif not self.count_only and self.schedules and len(self.schedules) != self.total_schedules:
+            text += f"，已加载 {len(self.schedules)} 个"
+        if cancelled:
+            text += "（已取消）"
+        self.schedule_count_label.setText(text)
+    
+    def toggle_background_count(self, checked):
+        if self.schedule_worker is not None:
+            self.schedule_worker.set_drain(checked)
+    
+    def show_schedule(self, idx):
+        with metrics.timer("render"):
+            if 0 <= idx < len(self.schedules):
+                self.export_btn.setEnabled(True)
+                self.cell_view = schedule_view(self.schedules[idx])
+                self.update_table_appearance()
+            else:
+                self.export_btn.setEnabled(False)
+                self.cell_view = {}
+                self.update_table_appearance()
+        self.update_schedule_score()
+    
+    def score_weights(self):
+        return {name: weight_input.value() for name, weight_input in self.weight_inputs.items()}
+    
+    def update_schedule_score(self):
+        if not 0 <= self.current_schedule_idx < len(self.schedules):
+            self.schedule_score_label.setText("")
+            return
+        occupied = 0
+        for course in self.schedules[self.current_schedule_idx]:
+            occupied |= course[2]
+        features = schedule_features(occupied)
+        self.schedule_score_label.setText(
+            "当前课表整学期: " + "，".join(f"{SCORE_LABELS[name]} {value}" for name, value in features.items()) +
+            f"，得分 {schedule_score(occupied, self.score_weights())}")
     
     def show_prev_schedule(self):
         if self.current_schedule_idx > 0:
@@ -529,18 +829,35 @@ class CourseSchedulerApp(QMainWindow):
             self.update_nav_buttons()
     
     def show_next_schedule(self):
+        if self.schedule_worker is not None:
+            self.schedule_worker.request(self.current_schedule_idx + 1 + SCHEDULE_PAGE_SIZE)
+            if self.current_schedule_idx >= len(self.schedules) - 1:
+                self.pending_next = True
         if self.current_schedule_idx < len(self.schedules) - 1:
             self.current_schedule_idx += 1
             self.show_schedule(self.current_schedule_idx)
             self.update_nav_buttons()
     
+    def schedules_pending(self):
+        # 数量还没统计出来时，只要搜索还在进行就认为还有课程表
+        if self.total_schedules is None:
+            return self.schedule_worker is not None
+        return len(self.schedules) < self.total_schedules
+    
     def update_nav_buttons(self):
         self.prev_btn.setEnabled(self.current_schedule_idx > 0)
-        self.next_btn.setEnabled(self.current_schedule_idx < len(self.schedules) - 1)
+        self.next_btn.setEnabled(self.current_schedule_idx < len(self.schedules) - 1 or
+                                 (self.schedule_worker is not None and self.current_schedule_idx >= 0 and
+                                  self.schedules_pending()))
+    
+    def live_search_available_courses(self):
+        if self.schedules and self.current_schedule_idx != -1:
+            self.search_available_courses()
     
     def search_available_courses(self):
         query = self.available_search_input.text().strip().lower()
-        self.available_courses_list.clear()
+        model = self.available_courses_list.model()
+        model.set_rows([])
         
         if not self.schedules or self.current_schedule_idx == -1:
             QMessageBox.warning(self, "警告", "请先创建或选择一个课表！")
@@ -548,31 +865,17 @@ class CourseSchedulerApp(QMainWindow):
         
         current_schedule = self.schedules[self.current_schedule_idx]
         existing_course_names = {course[0] for course in current_schedule}
-        booked_slots = np.zeros((16, 7, 11), dtype=bool)
+        booked_slots = 0
         for course in current_schedule:
-            booked_slots = np.logical_or(booked_slots, course[2])
+            booked_slots |= course[2]
 
-        for course in self.course_list:
-            if course[0] in existing_course_names:
-                continue
-            
-            matches_query = (
-                query in course[0].lower() or
-                query in course[1].lower() or
-                query in course[3].lower()
-            )
-            
-            conflicts_with_schedule = np.any(np.logical_and(booked_slots, course[2]))
-            conflicts_with_locks = np.any(np.logical_and(self.locked_time_slots, course[2]))
-            
-            if matches_query and not conflicts_with_schedule and not conflicts_with_locks:
-                item = QListWidgetItem(f"{course[0]} - {course[1]}\n时间: {course[3]}")
-                item.setData(Qt.UserRole, course)
-                self.available_courses_list.addItem(item)
+        with metrics.timer("available"):
+            model.set_rows(self.catalog.available(booked_slots | self.locked_time_slots, query,
+                                                  existing_course_names))
 
     def add_selected_available_course(self):
-        selected_item = self.available_courses_list.currentItem()
-        if not selected_item:
+        index = self.available_courses_list.currentIndex()
+        if not index.isValid():
             QMessageBox.warning(self, "警告", "请先选择一个课程！")
             return
         
@@ -580,14 +883,14 @@ class CourseSchedulerApp(QMainWindow):
             QMessageBox.warning(self, "警告", "请先创建或选择一个课表！")
             return
         
-        course = selected_item.data(Qt.UserRole)
+        course = self.course_list[index.data(Qt.UserRole)]
         current_schedule = self.schedules[self.current_schedule_idx]
         
         if any(c[0] == course[0] for c in current_schedule):
             QMessageBox.warning(self, "警告", f"课程'{course[0]}'已存在于当前课表中！")
             return
         
-        if np.any(np.logical_and(self.locked_time_slots, course[2])):
+        if self.locked_time_slots & course[2]:
             QMessageBox.warning(self, "时间冲突", 
                                f"课程 '{course[0]}' 与锁定的时间段冲突，无法添加")
             return
@@ -605,6 +908,11 @@ class CourseSchedulerApp(QMainWindow):
             return
         
         try:
+            # pandas 与 openpyxl 导入较慢，首次导出时才导入
+            import pandas as pd
+            from openpyxl.utils import get_column_letter
+            from openpyxl.styles import Alignment
+            
             options = QFileDialog.Options()
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             default_filename = f"课程表_{timestamp}.xlsx"
@@ -623,35 +931,30 @@ class CourseSchedulerApp(QMainWindow):
             if not filename.endswith('.xlsx'):
                 filename += '.xlsx'
             
-            schedule = self.schedules[self.current_schedule_idx]
-            weekdays = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
-            periods = [f"第{i+1}节" for i in range(11)]
-            timetable = [["" for _ in range(7)] for _ in range(11)]
-            
-            for course in schedule:
-                course_name = f"{course[0]}\n({course[1]})"
-                for day in range(7):
-                    for period in range(11):
-                        if course[2][1, day, period]:
-                            if timetable[period][day]:
-                                timetable[period][day] += "\n" + course_name
-                            else:
-                                timetable[period][day] = course_name
+            with metrics.timer("export"):
+                schedule = self.schedules[self.current_schedule_idx]
+                weekdays = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+                periods = [f"第{i+1}节" for i in range(11)]
+                timetable = [["" for _ in range(7)] for _ in range(11)]
+                
+                for (day, period), courses_in_slot in schedule_cells(schedule).items():
+                    timetable[period][day] = "\n".join(
+                        cell_label(course, weeks, "\n") for course, weeks in courses_in_slot)
 
-            df = pd.DataFrame(timetable, columns=weekdays, index=periods)
-            
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-                df.to_excel(writer, index=True, sheet_name='课程表')
+                df = pd.DataFrame(timetable, columns=weekdays, index=periods)
                 
-                worksheet = writer.sheets['课程表']
-                worksheet.column_dimensions['A'].width = 8
-                for col in range(1, 8): 
-                    column_letter = get_column_letter(col + 1)
-                    worksheet.column_dimensions[column_letter].width = 25 
+                with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+                    df.to_excel(writer, index=True, sheet_name='课程表')
+                    
+                    worksheet = writer.sheets['课程表']
+                    worksheet.column_dimensions['A'].width = 8
+                    for col in range(1, 8): 
+                        column_letter = get_column_letter(col + 1)
+                        worksheet.column_dimensions[column_letter].width = 25 
                     
-                for row in worksheet.iter_rows():
-                    for cell in row:
-                        cell.alignment = Alignment(wrap_text=True, vertical='center', horizontal='center')
+                    for row in worksheet.iter_rows():
+                        for cell in row:
+                            cell.alignment = Alignment(wrap_text=True, vertical='center', horizontal='center')
             
             QMessageBox.information(self, "导出成功", f"课程表已成功导出到:\n{filename}")
         
@@ -663,135 +966,251 @@ class CourseSchedulerApp(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"导出过程中发生错误:\n{str(e)}")
 
-def parse_schedule(kcxx_text):
-    schedule = np.zeros((16, 7, 11), dtype=bool)
-    time_texts = []
-    
-    schedule_patterns = re.findall(r'<p>([^<]+?)</p>', kcxx_text)
-    for pattern in schedule_patterns:
-        if "周," not in pattern:
-            continue
-        if not any(str(i) in pattern for i in range(1, 12)): 
-            continue
-        
-        time_texts.append(pattern) 
-        
-        week_part = pattern.split('周,')[0].strip()
-        weeks = parse_weeks(week_part)
-        day_period_part = pattern.split('周,')[1].strip()
-        day, periods = parse_day_periods(day_period_part)
-        
-        for week in weeks:
-            for period in periods:
-                if 1 <= week <= 16 and 1 <= day <= 7 and 1 <= period <= 11:
-                    schedule[week-1, day-1, period-1] = True
-    
-    time_text = "；".join(time_texts)
-    return schedule, time_text
+class CatalogLoader(QObject):
+    # 在守护线程中登录、下载或读取课程数据，关闭窗口时不必等待网络请求结束；
+    # 信号从非 Qt 线程发出，会自动排队到主线程处理
+    status = pyqtSignal(str)
+    loaded = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+    
+    def __init__(self, load):
+        super().__init__()
+        self.load = load
+    
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+    
+    def run(self):
+        try:
+            with metrics.timer("catalog.load"):
+                course_list = self.load(self.status.emit)
+            catalog = None
+            if course_list is not None:
+                self.status.emit("正在建立课程索引...")
+                with metrics.timer("catalog.index"):
+                    catalog = CourseCatalog(course_list)
+        except Exception as e:
+            self.failed.emit(f"加载课程数据失败: {str(e)}")
+            return
+        self.loaded.emit(course_list, catalog)
 
-def parse_weeks(week_str):
-    weeks = []
-    week_str = week_str.strip().replace('周', '').replace(' ', '')
-    if not week_str:
-        return weeks
-    parts = week_str.split(',')
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-        if '单' in part or '双' in part:
-            parity = '单' if '单' in part else '双'
-            num_part = part.replace(parity, '')
-            if '-' in num_part:
-                start, end = map(int, num_part.split('-'))
-                weeks.extend([
-                    w for w in range(start, end + 1) 
-                    if (w % 2 == 1 if parity == '单' else w % 2 == 0)
-                ])
-            else:
-                num = int(num_part)
-                if (num % 2 == 1 if parity == '单' else num % 2 == 0):
-                    weeks.append(num)
-        elif '-' in part:
-            start, end = map(int, part.split('-'))
-            weeks.extend(range(start, end + 1))
+class ScheduleWorker(QThread):
+    progress = pyqtSignal(int, int, int)
+    maximum = pyqtSignal(int)
+    counted = pyqtSignal(int, object, object)
+    schedules_found = pyqtSignal(object)
+    
+    def __init__(self, courses, locked_slots, limit=0, drain=False, workers=1, count_only=False, weights=None,
+                 session=None):
+        super().__init__()
+        self.count_only = count_only
+        self.weights = weights
+        self.session = session
+        self.locked_slots = locked_slots
+        self.incremental = False
+        self.solver = ScheduleSolver.from_courses(courses, locked_slots, self.progress.emit)
+        self.counter = self.solver.copy()
+        self.count_thread = None
+        self.workers = workers
+        self.limit = limit
+        self.drain = drain
+        self.cancelled = False
+        self.produced = 0
+        self.waited = 0.0
+        self.wanted = SCHEDULE_PAGE_SIZE
+        self.condition = threading.Condition()
+    
+    def request(self, count):
+        with self.condition:
+            self.wanted = max(self.wanted, count)
+            self.condition.notify()
+    
+    def set_drain(self, drain):
+        with self.condition:
+            self.drain = drain
+            self.condition.notify()
+    
+    def cancel(self):
+        with self.condition:
+            self.cancelled = True
+            self.solver.stopped = True
+            self.counter.stopped = True
+            self.condition.notify()
+    
+    def wait_for_demand(self):
+        start = time.perf_counter()
+        with self.condition:
+            while not (self.drain or self.cancelled or self.produced < self.wanted):
+                self.condition.wait()
+        self.waited += time.perf_counter() - start
+        return not self.cancelled
+    
+    def should_emit(self, batch, last_emit):
+        if not self.produced or len(batch) >= SCHEDULE_PAGE_SIZE:
+            return True
+        if not self.drain and self.produced + len(batch) >= self.wanted:
+            return True
+        return time.monotonic() - last_emit >= 0.1
+    
+    def emit_batch(self, batch):
+        self.produced += len(batch)
+        self.schedules_found.emit(batch)
+        self.progress.emit(self.solver.nodes, self.solver.found, self.solver.best)
+    
+    def run(self):
+        if profiler is not None:
+            profiler.enable()
+        try:
+            self.search()
+            if self.count_thread is not None:
+                self.count_thread.join()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            self.solver.record_metrics()
+            self.counter.record_metrics()
+    
+    def count(self, solver, max_courses):
+        # 数量不多时记下求解器，之后锁定时间或所选课程变化时再枚举出全部课程表做增量求解；
+        # 仅统计数量时不保存课程表
+        _, total, variants = solver.count_schedules()
+        if self.cancelled:
+            return
+        self.counted.emit(max_courses, total, variants)
+        if self.session is None or self.count_only:
+            return
+        if total > SESSION_LIMIT:
+            self.session.clear()
         else:
-            try:
-                weeks.append(int(part))
-            except ValueError:
-                continue
-    weeks = sorted(list(set(weeks)))
-    return weeks
+            self.session.defer(solver.copy(), max_courses)
+    
+    def search(self):
+        # 最多课程数很快就能求出，先开始枚举；精确统计数量可能要很久，在另一个线程里同时进行
+        max_courses = self.solver.max_courses()
+        if self.cancelled:
+            return
+        self.maximum.emit(max_courses)
+        schedules = None
+        if self.session is not None and self.weights is None:
+            # 保存的结果仍然有效时只过滤旧结果并搜索新打开的分支，数量也直接由结果得到
+            update = self.session.update(self.solver, self.locked_slots, max_courses, fill=not self.count_only)
+            if update is not None:
+                schedules, variants = update
+                self.incremental = True
+                self.counted.emit(max_courses, len(schedules), variants)
+                if self.count_only:
+                    return
+        if schedules is None:
+            if self.count_only:
+                self.count(self.solver, max_courses)
+                return
+            self.count_thread = threading.Thread(target=self.count, args=(self.counter, max_courses),
+                                                 daemon=True)
+            self.count_thread.start()
+            if self.weights is not None:
+                # 排序需要搜索完才能确定前几名，取消时给出已搜索部分中最好的结果
+                ranked = self.solver.top_schedules(max_courses, self.limit or RANKED_SCHEDULES, self.weights)
+                if ranked:
+                    self.emit_batch([schedule for _, schedule in ranked])
+                return
+            schedules = self.solver.iter_schedules(max_courses, self.workers)
+        
+        if self.limit:
+            schedules = islice(schedules, self.limit)
+        batch = []
+        last_emit = time.monotonic()
+        start = time.perf_counter()
+        try:
+            for schedule in schedules:
+                batch.append(schedule)
+                if not self.should_emit(batch, last_emit):
+                    continue
+                if not self.produced:
+                    metrics.add_time("solver.first_result", time.perf_counter() - start)
+                self.emit_batch(batch)
+                batch = []
+                last_emit = time.monotonic()
+                if not self.wait_for_demand():
+                    return
+            if batch:
+                self.emit_batch(batch)
+        finally:
+            # 等待用户翻页的时间单独记为 solver.wait，不计入搜索耗时
+            metrics.add_time("solver.enumerate", time.perf_counter() - start - self.waited)
+            metrics.add_time("solver.wait", self.waited)
 
-def parse_day_periods(day_period_str):
-    day_map = {
-        '星期一': 1, '星期二': 2, '星期三': 3, '星期四': 4,
-        '星期五': 5, '星期六': 6, '星期日': 7, '星期天': 7
-    }
-    day = None
-    for ch_day, num in day_map.items():
-        if ch_day in day_period_str:
-            day = num
-            break
-    if day is None:
-        return None, []
-    period_part = day_period_str.split('第')[-1]
-    period_numbers = []
-    current_number = ''
-    for char in period_part:
-        if char.isdigit():
-            current_number += char
-        elif current_number:
-            period_numbers.append(current_number)
-            current_number = ''
-    if current_number:
-        period_numbers.append(current_number)
-    if not period_numbers:
-        return day, []
-    if '-' in period_part:
-        if len(period_numbers) >= 2:
-            start = int(period_numbers[0])
-            end = int(period_numbers[1])
-            periods = list(range(start, end+1))
-        else:
-            periods = []
-    else:
-        periods = [int(period_numbers[0])]
-    return day, periods
+def create_session(header):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(header)
+    session.verify = False
+    return session
 
-def get_course(semester_data, header):
-    print("正在获取课程数据...")
+def fetch_course_page(session, semester_data, course_type, page):
+    data = {
+            "p_xn": semester_data['p_xn'],
+            "p_xq": semester_data['p_xq'],
+            "p_xnxq": semester_data['p_xnxq'],
+            "p_pylx": 1,
+            "mxpylx": 1,
+            "p_xkfsdm": course_type,
+            "pageNum": page,
+            "pageSize": CATALOG_PAGE_SIZE
+        }
+    with metrics.timer(f"fetch.{course_type}"):
+        req = session.post(f'{TIS_URL}/Xsxk/queryKxrw', data=data)
+        return loads(req.text).get('kxrwList') or {}
+
+def page_count(kxrw_list):
+    if kxrw_list.get('pages'):
+        return int(kxrw_list['pages'])
+    if kxrw_list.get('total'):
+        return -(-int(kxrw_list['total']) // CATALOG_PAGE_SIZE)
+    return 1
+
+def fetch_course_pages(semester_data, session):
+    course_types = list(course_reference)
+    with ThreadPoolExecutor(FETCH_WORKERS) as executor:
+        first_pages = list(executor.map(
+            lambda course_type: fetch_course_page(session, semester_data, course_type, 1),
+            course_types))
+        jobs = [(course_type, page)
+                for course_type, kxrw_list in zip(course_types, first_pages)
+                for page in range(2, page_count(kxrw_list) + 1)]
+        later_pages = executor.map(
+            lambda job: fetch_course_page(session, semester_data, *job), jobs)
+        
+        pages = defaultdict(list)
+        for course_type, kxrw_list in zip(course_types, first_pages):
+            pages[course_type].append(kxrw_list)
+        for (course_type, _), kxrw_list in zip(jobs, later_pages):
+            pages[course_type].append(kxrw_list)
+    return pages
+
+def parse_course_pages(pages):
     class_data = []
-    for course_type in ['bxxk', 'xxxk', 'kzyxk', 'zynknjxk','jhnxk']:
-        data = {
-                "p_xn": semester_data['p_xn'],
-                "p_xq": semester_data['p_xq'],
-                "p_xnxq": semester_data['p_xnxq'],
-                "p_pylx": 1,
-                "mxpylx": 1,
-                "p_xkfsdm": course_type,
-                "pageNum": 1,
-                "pageSize": 1000 
-            }
-        print(f"正在获取 {course_reference[course_type]} 课程数据...")
-        req = requests.post('https://tis.sustech.edu.cn/Xsxk/queryKxrw', data=data, headers=header, verify=False)
-        raw_class_data = loads(req.text)
-        if raw_class_data.get('kxrwList'):
-            for i in raw_class_data['kxrwList']['list']:
-                schedule_array, time_text = parse_schedule(i['kcxx'])
-                print(f"获取课程: {i['kcmc']} - 助教/教师: {i['dgjsmc']}")
-                class_data.append([
-                    i['kcmc'],   
-                    i['dgjsmc'],  
-                    schedule_array,
-                    time_text,
-                    course_reference[course_type]
-                ])
+    with metrics.timer("parse"):
+        for course_type in course_reference:
+            count = len(class_data)
+            for kxrw_list in pages.get(course_type, []):
+                class_data.extend(parse_course_page(kxrw_list, course_type))
+            print(f"{course_reference[course_type]}: {len(class_data) - count} 个课程班级")
     return class_data
 
+def get_course(semester_data, session, record_path=None):
+    print("正在获取课程数据...")
+    with metrics.timer("fetch"):
+        pages = fetch_course_pages(semester_data, session)
+    if record_path:
+        save_fixture(record_path, semester_data, pages)
+    return parse_course_pages(pages)
+
+
 def login(user_name, pwd, header):
     try:
-        login_url = "https://cas.sustech.edu.cn/cas/login?service=https%3A%2F%2Ftis.sustech.edu.cn%2Fcas"
+        login_url = f"{CAS_URL}/cas/login?service={quote(TIS_URL + '/cas', safe='')}"
         req = requests.get(login_url, verify=False)
         assert req.status_code == 200
         
@@ -830,28 +1249,53 @@ def login(user_name, pwd, header):
         print(f"登录过程中发生错误: {str(e)}")
         return "", ""
 
-if __name__ == "__main__":
-    header = {
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.0.0 Safari/537.36",
-        "x-requested-with": "XMLHttpRequest"
-    }
-    
-    route = ""
-    JSESSIONID = ""
-    while route == "" or JSESSIONID == "":
-        user_name = input("请输入tis账号: ")
-        pwd = getpass.getpass("请输入tis密码(密码不会显示): ")
+def download_catalog(user_name, pwd, record_path=None, on_status=print):
+    header = dict(HEADER)
+    on_status("正在登录tis...")
+    with metrics.timer("login"):
         route, JSESSIONID = login(user_name, pwd, header)
-        if route == "" or JSESSIONID == "":
-            print("登陆失败，请检查用户名和密码或网络连接。")
+    if route == "" or JSESSIONID == "":
+        raise ValueError("登陆失败，请检查用户名和密码或网络连接。")
     
     header['cookie'] = f"route={route}; JSESSIONID={JSESSIONID}"
-    print("登录成功！")
+    on_status("登录成功，正在下载课程数据...")
     
-    semester_info = loads(requests.post('https://tis.sustech.edu.cn/Xsxk/queryXkdqXnxq', data={"mxpylx": 1}, headers=header, verify=False).text)
-    course_list = get_course(semester_info, header)
+    session = create_session(header)
+    semester_info = loads(session.post(f'{TIS_URL}/Xsxk/queryXkdqXnxq', data={"mxpylx": 1}).text)
+    course_list = get_course(semester_info, session, record_path)
+    with metrics.timer("cache.save"):
+        save_catalog_cache(semester_info['p_xnxq'], course_list)
+    return course_list
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="南科大排课辅助工具")
+    parser.add_argument("--refresh", action="store_true", help="忽略本地缓存，重新登录并下载课程数据")
+    parser.add_argument("--offline", metavar="FIXTURE", help="不联网，直接从课程数据文件加载课程")
+    parser.add_argument("--record", metavar="FIXTURE", help="下载课程数据时另存为课程数据文件，供 --offline 和 tis_standin.py 使用")
+    parser.add_argument("--base-url", help="替换 cas 与 tis 的地址，例如本地的 tis_standin.py")
+    parser.add_argument("--metrics", action="store_true", help="退出时输出登录、下载、解析、搜索、绘制等阶段的耗时与搜索计数")
+    parser.add_argument("--metrics-json", metavar="PATH", help="退出时把各阶段耗时与搜索计数写入 JSON 文件")
+    parser.add_argument("--profile", metavar="PATH", help="用 cProfile 记录课程表搜索，退出时写入 PATH，可用 pstats 或 snakeviz 查看")
+    args = parser.parse_args()
+    if args.base_url:
+        CAS_URL = TIS_URL = args.base_url.rstrip("/")
+    if args.profile:
+        profiler = cProfile.Profile()
     
+    # 先打开窗口，课程数据在后台加载；没有可用缓存时弹出登录窗口
     app = QApplication([])
-    window = CourseSchedulerApp(course_list)
-    window.show()
-    app.exec_()
\ No newline at end of file
+    window = CourseSchedulerApp(record_path=args.record)
+    if args.offline:
+        window.load_catalog(lambda on_status: load_fixture(args.offline))
+    elif args.refresh or args.record:
+        QTimer.singleShot(0, window.show_login_dialog)
+    else:
+        window.load_catalog(lambda on_status: load_catalog_cache())
+    app.exec_()
+    
+    if args.metrics:
+        print(metrics.summary())
+    if args.metrics_json:
+        metrics.dump(args.metrics_json)
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
\ No newline at end of file
@@ -0,0 +1,1088 @@
+import numpy as np
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+from heapq import heappush, heapreplace
+import os
+import sys
+import glob
+import argparse
+import re
+import time
+import threading
+import queue
+from contextlib import contextmanager
+import multiprocessing
+from json import loads, dumps
+from concurrent.futures import ProcessPoolExecutor
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None
+
+# 排课引擎: 时间掩码、课程目录、求解器与课程数据读写，不依赖 Qt，可以在无界面的服务器上单独运行
+
+course_reference = {
+    "bxxk": "通识必修选课",
+    "xxxk": "通识选修选课",
+    "kzyxk": "培养方案内选课",
+    "zynknjxk": "非培养方案内选课",
+    "jhnxk": "重修选课"
+}
+PROGRESS_INTERVAL = 4096
+PARALLEL_CHUNK = 256  # 并行搜索时子进程每次交回的课程表数量
+PARALLEL_QUEUE_CHUNKS = 8  # 调用方还没取走的结果块上限
+COUNT_MEMO_LIMIT = 500000  # 统计课程表数量时记忆化表的条目上限，约占 150 MB，超过后从最深的课程组开始清掉一半
+SESSION_LIMIT = 100000  # 增量求解最多保存的课程表数量
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+CACHE_TTL = 24 * 3600
+
+class Metrics:
+    # 各阶段累计耗时与计数器，线程安全，开销只有一次 perf_counter 和一次加锁
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.counters = defaultdict(int)
+    
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+    
+    def add_time(self, name, seconds):
+        with self.lock:
+            calls, total, longest = self.timings.get(name, (0, 0.0, 0.0))
+            self.timings[name] = calls + 1, total + seconds, max(longest, seconds)
+    
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+    
+    def as_dict(self):
+        with self.lock:
+            return {
+                "timings": {name: {"calls": calls, "seconds": total, "max_seconds": longest}
+                            for name, (calls, total, longest) in self.timings.items()},
+                "counters": dict(self.counters),
+            }
+    
+    def summary(self):
+        data = self.as_dict()
+        lines = ["阶段耗时:"]
+        for name, timing in sorted(data["timings"].items()):
+            lines.append(f"  {name:<24}{timing['seconds'] * 1000:>10.1f} ms"
+                         f"  {timing['calls']:>6} 次  最长 {timing['max_seconds'] * 1000:.1f} ms")
+        lines.append("计数器:")
+        for name, value in sorted(data["counters"].items()):
+            lines.append(f"  {name:<24}{value:>10}")
+        return "\n".join(lines)
+    
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(dumps(self.as_dict(), ensure_ascii=False, indent=1))
+
+metrics = Metrics()
+
+
+WEEKS, DAYS, PERIODS = 16, 7, 11
+SLOTS_PER_WEEK = DAYS * PERIODS
+# 课程时间用一个 Python int 表示: 第 week*77 + day*11 + period 位对应一个课时
+FIRST_WEEK = (1 << SLOTS_PER_WEEK) - 1
+EVERY_WEEK = sum(1 << (week * SLOTS_PER_WEEK) for week in range(WEEKS))
+
+def cell_bit(day, period):
+    return 1 << (day * PERIODS + period)
+
+def cell_mask(day, period):
+    return cell_bit(day, period) * EVERY_WEEK
+
+def week_projection(mask):
+    projection = 0
+    while mask:
+        projection |= mask & FIRST_WEEK
+        mask >>= SLOTS_PER_WEEK
+    return projection
+
+def iter_cells(slots):
+    while slots:
+        low = slots & -slots
+        yield divmod(low.bit_length() - 1, PERIODS)
+        slots ^= low
+
+def cell_weeks(mask, day, period):
+    bit = day * PERIODS + period
+    return [week + 1 for week in range(WEEKS) if mask >> (week * SLOTS_PER_WEEK + bit) & 1]
+
+def format_weeks(weeks):
+    # [1, 3, ..., 15] -> "单1-15周"，[1, 2, ..., 8] -> "1-8周"，其余按连续区间列出
+    if len(weeks) > 2 and all(b - a == 2 for a, b in zip(weeks, weeks[1:])):
+        return f"{'单' if weeks[0] % 2 else '双'}{weeks[0]}-{weeks[-1]}周"
+    ranges = []
+    for week in weeks:
+        if ranges and week == ranges[-1][1] + 1:
+            ranges[-1][1] = week
+        else:
+            ranges.append([week, week])
+    return ",".join(f"{start}-{end}" if end > start else f"{start}" for start, end in ranges) + "周"
+
+def schedule_cells(schedule):
+    # (星期, 节次) -> [(课程, 该课程在这个单元格上课的周次)]
+    cells = defaultdict(list)
+    for course in schedule:
+        for day, period in iter_cells(week_projection(course[2])):
+            cells[day, period].append((course, cell_weeks(course[2], day, period)))
+    return cells
+
+def cell_label(course, weeks, separator=""):
+    # 不是每周都上的课在名称后标注周次，单双周课程可以共用一个单元格
+    label = f"{course[0]}{separator}({course[1]})"
+    if len(weeks) < WEEKS:
+        label += f"{separator}[{format_weeks(weeks)}]"
+    return label
+
+@lru_cache(maxsize=None)
+def section_cells(name, teacher, mask):
+    # 每个课程班级在周视图中的 (单元格, 周次位图, 标签) 只计算一次，翻页时直接复用
+    course = (name, teacher)
+    cells = []
+    for day, period in iter_cells(week_projection(mask)):
+        weeks = cell_weeks(mask, day, period)
+        cells.append(((day, period), sum(1 << week for week in weeks), cell_label(course, weeks)))
+    return tuple(cells)
+
+def schedule_view(schedule):
+    # (星期, 节次) -> (单元格文字, 是否有周次重叠)
+    labels = defaultdict(list)
+    weeks = defaultdict(int)
+    conflicts = set()
+    for course in schedule:
+        for cell, bits, label in section_cells(course[0], course[1], course[2]):
+            labels[cell].append(label)
+            if weeks[cell] & bits:
+                conflicts.add(cell)
+            weeks[cell] |= bits
+    return {cell: ("\n".join(sorted(texts)), cell in conflicts) for cell, texts in labels.items()}
+
+# 偏好评分: 每一项都是整个学期的课时数或天数，得分越低越好
+SCORE_WEIGHTS = {"early": 1, "days": 2, "gaps": 1, "late": 1}
+EARLY_SLOTS = sum(cell_mask(day, period) for day in range(DAYS) for period in (0, 1))
+LATE_SLOTS = sum(cell_mask(day, period) for day in range(DAYS) for period in range(8, PERIODS))
+ALL_SLOTS = (1 << WEEKS * SLOTS_PER_WEEK) - 1
+LAST_PERIOD = sum(cell_mask(day, PERIODS - 1) for day in range(DAYS))
+# 在每天 11 节课的范围内移位时保留的位，避免跨天
+KEEP_LATER = {shift: sum(cell_mask(day, period) for day in range(DAYS) for period in range(shift, PERIODS))
+              for shift in (1, 2, 4, 8)}
+KEEP_EARLIER = {shift: sum(cell_mask(day, period) for day in range(DAYS) for period in range(PERIODS - shift))
+                for shift in (1, 2, 4, 8)}
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+def fill_later(mask):
+    # 每天从第一节课起向后填满
+    for shift in (1, 2, 4, 8):
+        mask |= (mask << shift) & KEEP_LATER[shift]
+    return mask
+
+def fill_earlier(mask):
+    for shift in (1, 2, 4, 8):
+        mask |= (mask >> shift) & KEEP_EARLIER[shift]
+    return mask
+
+def schedule_features(occupied, fillable=0):
+    # fillable 是之后还可能被课程占用的课时；空档只会被填上才消失，填不上的空档一定会保留
+    later = fill_later(occupied)
+    return {
+        "early": popcount(occupied & EARLY_SLOTS),
+        "days": popcount(later & LAST_PERIOD),
+        "gaps": popcount(later & fill_earlier(occupied) & ~occupied & ~fillable & ALL_SLOTS),
+        "late": popcount(occupied & LATE_SLOTS),
+    }
+
+def schedule_score(occupied, weights, fillable=0):
+    features = schedule_features(occupied, fillable)
+    return sum(weights.get(name, 0) * value for name, value in features.items())
+
+MASK_BYTES = WEEKS * SLOTS_PER_WEEK // 8
+
+def masks_to_matrix(masks):
+    raw = b"".join(mask.to_bytes(MASK_BYTES, 'little') for mask in masks)
+    packed = np.frombuffer(raw, dtype=np.uint8).reshape(len(masks), MASK_BYTES)
+    return np.unpackbits(packed, axis=1, bitorder='little')
+
+def conflict_bitsets(masks):
+    # 第 i 个整数的第 j 位表示 masks[i] 与 masks[j] 有重叠
+    matrix = masks_to_matrix(masks).astype(np.float32)
+    overlaps = np.packbits((matrix @ matrix.T) > 0, axis=1, bitorder='little')
+    return [int.from_bytes(row.tobytes(), 'little') for row in overlaps]
+
+MASK_WORDS = (MASK_BYTES + 7) // 8
+
+def masks_to_words(masks):
+    raw = b"".join(mask.to_bytes(MASK_WORDS * 8, 'little') for mask in masks)
+    return np.frombuffer(raw, dtype='<u8').reshape(len(masks), MASK_WORDS)
+
+def pinyin_initials(text):
+    if lazy_pinyin is None:
+        return ""
+    return "".join(lazy_pinyin(text, style=Style.FIRST_LETTER)).lower()
+
+def text_grams(text):
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return {gram for gram in grams if "\0" not in gram}
+
+def build_gram_index(texts):
+    # 单字和双字索引，中文课程名按字切分比按词切分可靠
+    index = defaultdict(set)
+    for key, text in texts.items():
+        for gram in text_grams(text):
+            index[gram].add(key)
+    return index
+
+def lookup_grams(index, texts, query):
+    if len(query) == 1:
+        grams = {query}
+    else:
+        grams = {query[i:i + 2] for i in range(len(query) - 1)}
+    postings = sorted((index.get(gram, set()) for gram in grams), key=len)
+    return [key for key in set.intersection(*postings) if query in texts[key]]
+
+class CourseCatalog:
+    def __init__(self, courses):
+        self.courses = courses
+        self.mask_words = masks_to_words([c[2] for c in courses])
+        self.search_text = {
+            i: "\0".join((c[0], c[1], c[3], pinyin_initials(c[0]))).lower()
+            for i, c in enumerate(courses)
+        }
+        self.text_index = build_gram_index(self.search_text)
+        
+        self.sections_by_name = defaultdict(list)
+        for i, course in enumerate(courses):
+            self.sections_by_name[course[0]].append(i)
+        self.name_text = {
+            name: "\0".join((name, pinyin_initials(name))).lower()
+            for name in self.sections_by_name
+        }
+        self.name_index = build_gram_index(self.name_text)
+    
+    def search_names(self, keyword):
+        return sorted(lookup_grams(self.name_index, self.name_text, keyword.lower()))
+    
+    def available(self, occupied, query="", exclude_names=()):
+        free = ~np.any(self.mask_words & masks_to_words([occupied])[0], axis=1)
+        if query:
+            candidates = sorted(lookup_grams(self.text_index, self.search_text, query.lower()))
+        else:
+            candidates = np.flatnonzero(free)
+        return [i for i in candidates
+                if free[i] and self.courses[i][0] not in exclude_names]
+
+class ScheduleSolver:
+    def __init__(self, conflicts, groups, sections=None, variants=None, on_progress=None):
+        self.sections = sections
+        self.conflicts = conflicts
+        self.groups = groups
+        self.group_bits = [sum(1 << i for i in group) for group in groups]
+        self.variants = variants or [1] * len(conflicts)
+        
+        self.on_progress = on_progress
+        self.nodes = 0
+        self.pruned = 0
+        self.checks = 0
+        self.memo_hits = 0
+        self.memo_resets = 0
+        self.found = 0
+        self.best = 0
+        self.stopped = False
+    
+    @classmethod
+    def from_courses(cls, courses, locked_slots=0, on_progress=None):
+        with metrics.timer("solver.prepare"):
+            return cls.prepare(courses, locked_slots, on_progress)
+    
+    @classmethod
+    def prepare(cls, courses, locked_slots, on_progress):
+        sections, variants = merge_equivalent_sections({
+            (c[0], c[1], c[2]): c for c in courses
+            if not locked_slots & c[2]
+        }.values())
+        conflicts = conflict_bitsets([c[2] for c in sections])
+        
+        course_groups = defaultdict(list)
+        for i, course in enumerate(sections):
+            course_groups[course[0]].append(i)
+        return cls(conflicts, list(course_groups.values()), sections, variants, on_progress)
+    
+    def copy(self):
+        # 共用课程与冲突数据、计数独立的求解器，用于在另一个线程里统计数量
+        return ScheduleSolver(self.conflicts, self.groups, self.sections, self.variants)
+    
+    def visit(self):
+        self.nodes += 1
+        if self.on_progress is not None and self.nodes % PROGRESS_INTERVAL == 0:
+            self.on_progress(self.nodes, self.found, self.best)
+        return not self.stopped
+    
+    def reachable(self, index, blocked):
+        return sum(1 for bits in self.group_bits[index:] if bits & ~blocked)
+    
+    def max_courses(self):
+        upper = self.reachable(0, 0)
+        
+        def search(index, blocked, count):
+            self.best = max(self.best, count)
+            if not self.visit() or index >= len(self.groups) or self.best == upper:
+                return
+            if count + self.reachable(index, blocked) <= self.best:
+                self.pruned += 1
+                return
+            self.checks += len(self.groups[index])
+            for i in self.groups[index]:
+                if not blocked >> i & 1:
+                    search(index + 1, blocked | self.conflicts[i], count + 1)
+            search(index + 1, blocked, count)
+        
+        search(0, 0, 0)
+        return self.best
+    
+    def count_schedules(self):
+        # 每个课程组一张记忆化表，以后续课程组中被占用的课程为键，
+        # 返回 (最多课程数, 课程表数量, 展开教师后的课程表数量)。
+        # 条目太多时先清掉深层的表，靠近根的条目省下的搜索最多，尽量保留
+        remaining = [0] * (len(self.groups) + 1)
+        for index in range(len(self.groups) - 1, -1, -1):
+            remaining[index] = remaining[index + 1] | self.group_bits[index]
+        memo = [{} for _ in self.groups]
+        size = 0
+        
+        def search(index, blocked):
+            nonlocal size
+            if index >= len(self.groups):
+                return 0, 1, 1
+            blocked &= remaining[index]
+            level = memo[index]
+            if blocked in level:
+                self.memo_hits += 1
+                return level[blocked]
+            if not self.visit():
+                return 0, 0, 0
+            best, ways, variants = search(index + 1, blocked)
+            self.checks += len(self.groups[index])
+            for i in self.groups[index]:
+                if not blocked >> i & 1:
+                    count, count_ways, count_variants = search(index + 1, blocked | self.conflicts[i])
+                    count_variants *= self.variants[i]
+                    if count + 1 > best:
+                        best, ways, variants = count + 1, count_ways, count_variants
+                    elif count + 1 == best:
+                        ways += count_ways
+                        variants += count_variants
+            if size >= COUNT_MEMO_LIMIT:
+                self.memo_resets += 1
+                for deep in reversed(memo):
+                    size -= len(deep)
+                    deep.clear()
+                    if size <= COUNT_MEMO_LIMIT // 2:
+                        break
+            level[blocked] = best, ways, variants
+            size += 1
+            self.best = max(self.best, best)
+            return best, ways, variants
+        
+        with metrics.timer("solver.count"):
+            best, ways, variants = search(0, 0)
+        if not best:
+            return 0, 0, 0
+        return best, ways, variants
+    
+    def iter_picks(self, target, index=0, blocked=0, picked=(), required=0):
+        # required 非零时只枚举至少包含其中一个课程的课程表，增量求解时用来只搜索新打开的分支
+        picked = list(picked)
+        required_after = [0] * (len(self.groups) + 1)
+        for i in range(len(self.groups) - 1, -1, -1):
+            required_after[i] = required_after[i + 1] | (self.group_bits[i] & required)
+        
+        def search(index, blocked, picked_bits):
+            if not self.visit():
+                return
+            if len(picked) == target:
+                if not required or picked_bits & required:
+                    self.found += 1
+                    yield tuple(picked)
+                return
+            if len(picked) + self.reachable(index, blocked) < target:
+                self.pruned += 1
+                return
+            if required and not picked_bits & required and not required_after[index] & ~blocked:
+                self.pruned += 1
+                return
+            self.checks += len(self.groups[index])
+            for i in self.groups[index]:
+                if not blocked >> i & 1:
+                    picked.append(i)
+                    yield from search(index + 1, blocked | self.conflicts[i], picked_bits | 1 << i)
+                    picked.pop()
+            yield from search(index + 1, blocked, picked_bits)
+        
+        if target:
+            yield from search(index, blocked, sum(1 << i for i in picked))
+    
+    def split(self, target, count):
+        # 按前一到两个课程组的选择把搜索树拆成子树，顺序与串行搜索一致
+        tasks = [(0, 0, ())]
+        for index in range(min(2, len(self.groups))):
+            if len(tasks) >= count:
+                break
+            next_tasks = []
+            for start, blocked, picked in tasks:
+                if len(picked) == target:
+                    next_tasks.append((start, blocked, picked))
+                    continue
+                for i in self.groups[index]:
+                    if not blocked >> i & 1:
+                        next_tasks.append((index + 1, blocked | self.conflicts[i], picked + (i,)))
+                next_tasks.append((index + 1, blocked, picked))
+            tasks = [task for task in next_tasks
+                     if len(task[2]) + self.reachable(task[0], task[1]) >= target]
+        return tasks
+    
+    def iter_picks_parallel(self, target, workers):
+        # 子任务轮流分给各子进程，每个子进程有自己的有界结果队列；调用方按 split 的顺序逐个读取子任务的结果，
+        # 因此结果顺序与串行搜索相同，领先的子进程在队列满时阻塞。生成器关闭或 stopped 时直接结束子进程
+        tasks = self.split(target, workers * 4)
+        workers = min(workers, len(tasks))
+        context = multiprocessing.get_context("spawn")
+        queues = [context.Queue(PARALLEL_QUEUE_CHUNKS) for _ in range(workers)]
+        processes = []
+        for worker in range(workers):
+            process = context.Process(target=enumerate_subtrees, daemon=True,
+                                      args=(self.conflicts, self.groups, target, tasks[worker::workers], queues[worker]))
+            process.start()
+            processes.append(process)
+        
+        try:
+            for number in range(len(tasks)):
+                results = queues[number % workers]
+                process = processes[number % workers]
+                done = False
+                while not done:
+                    try:
+                        picks, stats, done = results.get(timeout=0.1)
+                    except queue.Empty:
+                        if self.stopped:
+                            return
+                        if process.exitcode not in (None, 0):
+                            raise RuntimeError("并行搜索的子进程意外退出")
+                        continue
+                    nodes = self.nodes
+                    self.nodes += stats[0]
+                    self.pruned += stats[1]
+                    self.checks += stats[2]
+                    if self.on_progress is not None and self.nodes // PROGRESS_INTERVAL > nodes // PROGRESS_INTERVAL:
+                        self.on_progress(self.nodes, self.found, self.best)
+                    for picked in picks:
+                        if self.stopped:
+                            return
+                        self.found += 1
+                        yield picked
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+            for results in queues:
+                results.cancel_join_thread()
+    
+    def top_picks(self, target, count, weights):
+        # 只保留得分最低的 count 个课程表；早课、晚课、在校天数只增不减，
+        # 加上填不上的空档就是子树得分的下界，下界进不了前 count 名的子树直接剪掉
+        masks = [section[2] for section in self.sections]
+        fillable = [0] * (len(self.groups) + 1)
+        for index in range(len(self.groups) - 1, -1, -1):
+            fillable[index] = fillable[index + 1]
+            for i in self.groups[index]:
+                fillable[index] |= masks[i]
+        heap = []
+        picked = []
+        
+        def search(index, blocked, occupied):
+            if not self.visit():
+                return
+            if len(picked) == target:
+                score = schedule_score(occupied, weights)
+                self.found += 1
+                if len(heap) < count:
+                    heappush(heap, (-score, -self.found, tuple(picked)))
+                elif score < -heap[0][0]:
+                    heapreplace(heap, (-score, -self.found, tuple(picked)))
+                return
+            if len(picked) + self.reachable(index, blocked) < target:
+                self.pruned += 1
+                return
+            if len(heap) == count and schedule_score(occupied, weights, fillable[index]) >= -heap[0][0]:
+                self.pruned += 1
+                return
+            self.checks += len(self.groups[index])
+            for i in self.groups[index]:
+                if not blocked >> i & 1:
+                    picked.append(i)
+                    search(index + 1, blocked | self.conflicts[i], occupied | masks[i])
+                    picked.pop()
+            search(index + 1, blocked, occupied)
+        
+        if target and count:
+            with metrics.timer("solver.rank"):
+                search(0, 0, 0)
+        return [(-score, picks) for score, _, picks in sorted(heap, reverse=True)]
+    
+    def top_schedules(self, target, count, weights=SCORE_WEIGHTS):
+        return [(score, [self.sections[i] for i in picked])
+                for score, picked in self.top_picks(target, count, weights)]
+    
+    def record_metrics(self):
+        for name in ("nodes", "pruned", "checks", "memo_hits", "memo_resets", "found"):
+            metrics.count(f"solver.{name}", getattr(self, name))
+    
+    def iter_schedules(self, target, workers=1):
+        if workers > 1 and target:
+            picks = self.iter_picks_parallel(target, workers)
+        else:
+            picks = self.iter_picks(target)
+        for picked in picks:
+            yield [self.sections[i] for i in picked]
+
+class ScheduleSession:
+    # 保存某一次求解的全部课程表 (不超过 SESSION_LIMIT 个)，锁定时间或所选课程变化后只处理受影响的部分:
+    # 新锁定的时间用一次向量化掩码测试过滤旧结果，新出现的课程只搜索包含它们的分支，
+    # 课程表数量直接由更新后的结果得到，不必重新统计。
+    # 最多课程数变化时旧结果不再有效，返回 None 交给调用方重新完整求解。
+    # 完整求解后只用 defer 记下求解器，等第一次需要增量更新时再枚举出全部课程表
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        self.pending = None
+        self.allowed = None
+        self.max_courses = 0
+        self.keys = []
+        self.occupied = masks_to_words([])
+    
+    @staticmethod
+    def section_key(course):
+        # 合并教师后同一课程同一时间只有一个分支，教师增减不影响课程表本身
+        return course[0], course[2]
+    
+    def store(self, solver, max_courses, schedules):
+        if len(schedules) > SESSION_LIMIT:
+            self.clear()
+            return
+        self.allowed = {self.section_key(c) for c in solver.sections}
+        self.max_courses = max_courses
+        self.keys = [tuple(self.section_key(c) for c in schedule) for schedule in schedules]
+        occupied = []
+        for schedule in schedules:
+            mask = 0
+            for course in schedule:
+                mask |= course[2]
+            occupied.append(mask)
+        self.occupied = masks_to_words(occupied)
+    
+    def defer(self, solver, max_courses):
+        self.clear()
+        self.pending = solver, max_courses
+    
+    def fill(self, solver):
+        # 枚举 defer 记下的求解器的结果；solver 是本次求解用的求解器，取消时中途放弃
+        pending, max_courses = self.pending
+        schedules = []
+        with metrics.timer("session.fill"):
+            for schedule in pending.iter_schedules(max_courses):
+                if solver.stopped:
+                    return False
+                schedules.append(schedule)
+        self.store(pending, max_courses, schedules)
+        return self.allowed is not None
+    
+    def update(self, solver, locked_slots, max_courses, fill=True):
+        # 返回 (全部课程表, 按教师展开后的数量)；fill 为假时不枚举 defer 记下的结果
+        if fill and self.pending is not None and self.pending[1] == max_courses and not self.fill(solver):
+            return None
+        if self.allowed is None or max_courses != self.max_courses:
+            return None
+        allowed = {self.section_key(c) for c in solver.sections}
+        removed = {key for key in self.allowed - allowed if not key[1] & locked_slots}
+        added = allowed - self.allowed
+        
+        with metrics.timer("session.filter"):
+            alive = ~np.any(self.occupied & masks_to_words([locked_slots])[0], axis=1)
+            kept = [i for i in np.flatnonzero(alive)
+                    if not removed or removed.isdisjoint(self.keys[i])]
+        with metrics.timer("session.extend"):
+            required = sum(1 << i for i, c in enumerate(solver.sections) if self.section_key(c) in added)
+            picks = list(solver.iter_picks(max_courses, required=required)) if required else []
+        if solver.stopped:
+            return None
+        
+        by_key = {self.section_key(c): i for i, c in enumerate(solver.sections)}
+        picks = [[by_key[key] for key in self.keys[i]] for i in kept] + picks
+        schedules = []
+        variants = 0
+        for picked in picks:
+            schedules.append([solver.sections[i] for i in picked])
+            ways = 1
+            for i in picked:
+                ways *= solver.variants[i]
+            variants += ways
+        self.store(solver, max_courses, schedules)
+        return schedules, variants
+
+def merge_equivalent_sections(courses):
+    # 同一课程中上课时间完全相同的班级只是教师不同，合并为一个分支，教师名用 "/" 连接
+    classes = {}
+    for course in courses:
+        key = (course[0], course[2])
+        if key in classes:
+            classes[key][1].append(course[1])
+        else:
+            classes[key] = (course, [course[1]])
+    
+    sections = []
+    for course, teachers in classes.values():
+        if len(teachers) > 1:
+            course = [course[0], "/".join(teachers), *course[2:]]
+        sections.append(course)
+    return sections, [len(teachers) for _, teachers in classes.values()]
+
+def enumerate_subtrees(conflicts, groups, target, tasks, results):
+    # 每满 PARALLEL_CHUNK 个结果或每 PROGRESS_INTERVAL 个节点交回一次，附带这段时间的搜索计数
+    solver = ScheduleSolver(conflicts, groups)
+    chunk = []
+    
+    def flush(done=False):
+        results.put((chunk[:], (solver.nodes, solver.pruned, solver.checks), done))
+        chunk.clear()
+        solver.nodes = solver.pruned = solver.checks = 0
+    
+    solver.on_progress = lambda *args: flush()
+    for task in tasks:
+        for picked in solver.iter_picks(target, *task):
+            chunk.append(picked)
+            if len(chunk) >= PARALLEL_CHUNK:
+                flush()
+        flush(True)
+
+SCHEDULE_PATTERN = re.compile(r'<p>([^<]+?)</p>')
+PERIOD_DIGIT = re.compile(r'[1-9]')
+DAY_MAP = {
+    '星期一': 1, '星期二': 2, '星期三': 3, '星期四': 4,
+    '星期五': 5, '星期六': 6, '星期日': 7, '星期天': 7
+}
+
+@lru_cache(maxsize=None)
+def parse_time_pattern(pattern):
+    # 不是上课时间的 <p> 返回 None；否则返回该时间段的掩码
+    if "周," not in pattern or not PERIOD_DIGIT.search(pattern):
+        return None
+    week_part, day_period_part = pattern.split('周,')[:2]
+    weeks = parse_weeks(week_part)
+    day, periods = parse_day_periods(day_period_part.strip())
+    if day is None:
+        return 0
+    # 周向量与节次向量的外积: 节次位不超过 77 位，乘法不会产生进位
+    week_spread = sum(1 << (week - 1) * SLOTS_PER_WEEK for week in weeks if 1 <= week <= WEEKS)
+    day_slots = sum(cell_bit(day - 1, period - 1) for period in periods
+                    if 1 <= day <= DAYS and 1 <= period <= PERIODS)
+    return week_spread * day_slots
+
+def parse_schedule(kcxx_text):
+    schedule = 0
+    time_texts = []
+    for pattern in SCHEDULE_PATTERN.findall(kcxx_text):
+        mask = parse_time_pattern(pattern)
+        if mask is None:
+            continue
+        time_texts.append(pattern)
+        schedule |= mask
+    
+    time_text = "；".join(time_texts)
+    return schedule, time_text
+
+def parse_course_page(kxrw_list, course_type):
+    courses = []
+    for i in kxrw_list.get('list') or []:
+        schedule_array, time_text = parse_schedule(i['kcxx'])
+        courses.append([
+            i['kcmc'],
+            i['dgjsmc'],
+            schedule_array,
+            time_text,
+            course_reference[course_type]
+        ])
+    return courses
+
+def parse_weeks(week_str):
+    weeks = []
+    week_str = week_str.strip().replace('周', '').replace(' ', '')
+    if not week_str:
+        return weeks
+    parts = week_str.split(',')
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        if '单' in part or '双' in part:
+            parity = '单' if '单' in part else '双'
+            num_part = part.replace(parity, '')
+            if '-' in num_part:
+                start, end = map(int, num_part.split('-'))
+                weeks.extend([
+                    w for w in range(start, end + 1) 
+                    if (w % 2 == 1 if parity == '单' else w % 2 == 0)
+                ])
+            else:
+                num = int(num_part)
+                if (num % 2 == 1 if parity == '单' else num % 2 == 0):
+                    weeks.append(num)
+        elif '-' in part:
+            start, end = map(int, part.split('-'))
+            weeks.extend(range(start, end + 1))
+        else:
+            try:
+                weeks.append(int(part))
+            except ValueError:
+                continue
+    weeks = sorted(list(set(weeks)))
+    return weeks
+
+def parse_day_periods(day_period_str):
+    day = None
+    for ch_day, num in DAY_MAP.items():
+        if ch_day in day_period_str:
+            day = num
+            break
+    if day is None:
+        return None, []
+    period_part = day_period_str.split('第')[-1]
+    period_numbers = []
+    current_number = ''
+    for char in period_part:
+        if char.isdigit():
+            current_number += char
+        elif current_number:
+            period_numbers.append(current_number)
+            current_number = ''
+    if current_number:
+        period_numbers.append(current_number)
+    if not period_numbers:
+        return day, []
+    if '-' in period_part:
+        if len(period_numbers) >= 2:
+            start = int(period_numbers[0])
+            end = int(period_numbers[1])
+            periods = list(range(start, end+1))
+        else:
+            periods = []
+    else:
+        periods = [int(period_numbers[0])]
+    return day, periods
+
+def save_fixture(path, semester_data, pages):
+    fixture = {
+        "semester": semester_data,
+        "kxrw": {
+            course_type: [i for kxrw_list in kxrw_pages for i in kxrw_list.get('list') or []]
+            for course_type, kxrw_pages in pages.items()
+        }
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(dumps(fixture, ensure_ascii=False, indent=1))
+
+def load_fixture(path):
+    with open(path, encoding='utf-8') as f:
+        fixture = loads(f.read())
+    courses = []
+    for course_type in course_reference:
+        courses.extend(parse_course_page({"list": fixture["kxrw"].get(course_type) or []}, course_type))
+    return courses
+
+def cache_path(semester):
+    return os.path.join(CACHE_DIR, f"catalog_{semester}.npz")
+
+def latest_cache_path():
+    paths = glob.glob(cache_path("*"))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+def save_catalog_cache(semester, courses):
+    # 时间掩码存为 (N, 20) uint64 矩阵，文本字段存为字符串表下标
+    strings = {}
+    fields = [[strings.setdefault(text, len(strings)) for text in (c[0], c[1], c[3], c[4])]
+              for c in courses]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # 临时文件名以 .tmp 结尾，写到一半中断时不会被 latest_cache_path 当作最新的缓存
+    temp_path = cache_path(semester) + ".tmp"
+    with open(temp_path, 'wb') as f:
+        np.savez(f,
+                 masks=masks_to_words([c[2] for c in courses]),
+                 fields=np.array(fields, dtype=np.int32).reshape(len(courses), 4),
+                 strings=np.array(list(strings), dtype=str),
+                 saved_at=np.array(time.time()))
+    os.replace(temp_path, cache_path(semester))
+
+def load_catalog_cache(semester=None, ttl=CACHE_TTL):
+    path = cache_path(semester) if semester is not None else latest_cache_path()
+    if path is None or not os.path.exists(path):
+        return None
+    return read_catalog_cache(path, ttl)
+
+def read_catalog_cache(path, ttl=None):
+    try:
+        with np.load(path) as data:
+            if ttl is not None and time.time() - float(data['saved_at']) > ttl:
+                return None
+            strings = data['strings'].tolist()
+            return [
+                [strings[name], strings[teacher], int.from_bytes(words.tobytes(), 'little'),
+                 strings[text], strings[course_type]]
+                for (name, teacher, text, course_type), words in zip(data['fields'].tolist(), data['masks'])
+            ]
+    except Exception as e:
+        print(f"读取课程缓存失败: {str(e)}", file=sys.stderr)
+        return None
+
+def load_catalog(path):
+    # 课程数据文件 (main.py --record 录制) 或课程缓存 (.npz)
+    if path.endswith(".npz"):
+        return read_catalog_cache(path)
+    return load_fixture(path)
+
+def parse_lock(text):
+    # "星期一第1-2节" 锁定每周的这两节课，"单1-15周,星期一第1-2节" 只锁定单周，不写节次锁定一整天
+    text = text.strip()
+    if "周," in text:
+        mask = parse_time_pattern(text)
+        if mask:
+            return mask
+        raise ValueError(f"无法识别的锁定时间段: {text}")
+    day, periods = parse_day_periods(text)
+    if day is None or not 1 <= day <= DAYS:
+        raise ValueError(f"无法识别的锁定时间段: {text}")
+    return sum(cell_mask(day - 1, period - 1) for period in periods or range(1, PERIODS + 1)
+               if 1 <= period <= PERIODS)
+
+def select_sections(catalog, wishlist):
+    # 心愿单中的一项是课程名，或 {"name": 课程名, "teachers": [教师, ...]} 只考虑部分教师的班级
+    sections = []
+    for entry in wishlist:
+        if isinstance(entry, str):
+            entry = {"name": entry}
+        indices = catalog.sections_by_name.get(entry["name"])
+        if not indices:
+            raise KeyError(f"课程目录中没有课程: {entry['name']}")
+        teachers = entry.get("teachers")
+        sections.extend(catalog.courses[i] for i in indices
+                        if not teachers or catalog.courses[i][1] in teachers)
+    return sections
+
+def parse_weights(weights):
+    # {"early": 1, ...} 或 "early=1,gaps=3"，没写的项使用默认权重；权重不能为负，否则剪枝用的下界不成立
+    if isinstance(weights, str):
+        weights = dict(item.split("=", 1) for item in weights.split(",") if item.strip())
+    parsed = dict(SCORE_WEIGHTS)
+    for name, value in weights.items():
+        name = name.strip()
+        if name not in SCORE_WEIGHTS:
+            raise ValueError(f"未知的偏好项: {name}，可选 {', '.join(SCORE_WEIGHTS)}")
+        try:
+            parsed[name] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"偏好权重应为数字: {name}={value}")
+        if parsed[name] < 0:
+            raise ValueError(f"偏好权重不能为负: {name}={value}")
+    return parsed
+
+def load_wishlist(path):
+    # {"courses": [心愿单], "locks": ["星期一第1-2节", ...], "weights": {"early": 1, ...}}，
+    # 写了 weights 时按偏好排序
+    with open(path, encoding='utf-8') as f:
+        wishlist = loads(f.read())
+    if not isinstance(wishlist, dict):
+        raise ValueError(f"心愿单应为 JSON 对象 {{\"courses\": [...]}}: {path}")
+    courses = wishlist.get("courses") or []
+    locks = wishlist.get("locks") or []
+    if not isinstance(courses, list) or not isinstance(locks, list):
+        raise ValueError(f"心愿单中的 courses 与 locks 应为列表: {path}")
+    for entry in courses:
+        if isinstance(entry, dict):
+            if not isinstance(entry.get("name"), str):
+                raise ValueError(f"心愿单中的课程缺少 name: {entry}")
+            if not isinstance(entry.get("teachers") or [], list):
+                raise ValueError(f"心愿单中课程的 teachers 应为列表: {entry}")
+        elif not isinstance(entry, str):
+            raise ValueError(f"心愿单中的课程应为课程名或 {{\"name\": ..., \"teachers\": [...]}}: {entry}")
+    if any(not isinstance(text, str) for text in locks):
+        raise ValueError(f"心愿单中的锁定时间段应为字符串: {locks}")
+    if "weights" in wishlist and not isinstance(wishlist["weights"], dict):
+        raise ValueError(f"心愿单中的 weights 应为 JSON 对象: {wishlist['weights']}")
+    
+    locked_slots = 0
+    for text in locks:
+        locked_slots |= parse_lock(text)
+    weights = parse_weights(wishlist["weights"]) if "weights" in wishlist else None
+    return courses, locked_slots, weights
+
+def schedule_record(schedule):
+    return [{"name": c[0], "teacher": c[1], "time": c[3], "type": c[4]} for c in schedule]
+
+def ranked_record(score, schedule):
+    return {"score": score, "courses": schedule_record(schedule)}
+
+_batch_catalog = None
+
+def init_batch_worker(catalog):
+    global _batch_catalog
+    _batch_catalog = catalog
+
+def solve_wishlist(path, output_dir, limit, summary):
+    wishlist, locked_slots, weights = load_wishlist(path)
+    solver = ScheduleSolver.from_courses(select_sections(_batch_catalog, wishlist), locked_slots)
+    max_courses, total, variants = solver.count_schedules()
+    if weights is not None:
+        results = [ranked_record(score, schedule)
+                   for score, schedule in solver.top_schedules(max_courses, limit or total, weights)]
+    else:
+        schedules = solver.iter_schedules(max_courses)
+        if limit:
+            schedules = islice(schedules, limit)
+        results = [schedule_record(schedule) for schedule in schedules]
+    summary.update(max_courses=max_courses, schedules=total, teacher_variants=variants,
+                   written=len(results))
+    with open(os.path.join(output_dir, "students", f"{summary['student']}.json"), 'w', encoding='utf-8') as f:
+        f.write(dumps(dict(summary, results=results), ensure_ascii=False, indent=1))
+
+def solve_wishlist_file(path, output_dir, limit):
+    start = time.perf_counter()
+    student = os.path.splitext(os.path.basename(path))[0]
+    summary = {"student": student, "wishlist": path}
+    try:
+        solve_wishlist(path, output_dir, limit, summary)
+    except KeyError as e:
+        summary["error"] = e.args[0]
+    except (OSError, ValueError) as e:
+        summary["error"] = str(e)
+    except Exception as e:
+        # 意外的错误也只记在这个心愿单的汇总里，不中断整个批次
+        summary["error"] = f"{type(e).__name__}: {e}"
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+def solve_batch(courses, paths, output_dir, limit=100, workers=None):
+    # 课程目录只建立一次，随进程池的初始化参数交给每个进程；fork 启动时各进程直接共享这份内存
+    # 每个心愿单的结果放在 students/ 子目录，与汇总的 summary.json 分开，心愿单叫 summary.json 也不会互相覆盖
+    catalog = CourseCatalog(courses)
+    os.makedirs(os.path.join(output_dir, "students"), exist_ok=True)
+    with ProcessPoolExecutor(workers, initializer=init_batch_worker, initargs=(catalog,)) as executor:
+        return list(executor.map(solve_wishlist_file, paths,
+                                 [output_dir] * len(paths), [limit] * len(paths)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="无界面排课: 读取课程数据与心愿单，以 JSON 输出课程表")
+    parser.add_argument("catalog", help="课程数据文件 (main.py --record 录制) 或 cache/ 下的课程缓存 (.npz)")
+    parser.add_argument("wishlist", nargs="?", help='心愿单 JSON: {"courses": [...], "locks": [...]}')
+    parser.add_argument("--course", action="append", default=[], help="追加一门想选的课程，可重复")
+    parser.add_argument("--lock", action="append", default=[], help="追加一个锁定时间段，例如 星期一第1-2节，可重复")
+    parser.add_argument("--limit", type=int, default=100, help="最多输出的课程表数量，0 表示不限")
+    parser.add_argument("--count-only", action="store_true", help="只统计课程表数量")
+    parser.add_argument("--rank", action="store_true", help="按偏好排序，只输出得分最低的 --limit 个课程表")
+    parser.add_argument("--weights", help=f"偏好权重，例如 early=1,gaps=3 (可选 {', '.join(SCORE_WEIGHTS)})，隐含 --rank")
+    parser.add_argument("--workers", type=int, help="并行的进程数，默认单个心愿单为 1，批量模式为 CPU 核数")
+    parser.add_argument("--batch", metavar="DIR", help="批量模式: 依次求解目录下的每个心愿单 (*.json)")
+    parser.add_argument("--output", metavar="DIR", default="results", help="批量模式的输出目录: summary.json 为汇总，students/ 下为每个心愿单的结果")
+    parser.add_argument("--format", choices=["jsonl", "json"], default="jsonl",
+                        help="jsonl 首行为最多课程数，随后每行一个课程表边搜索边输出，最后一行为课程表数量；"
+                             "json 搜索完成后输出一个文档")
+    parser.add_argument("--metrics", action="store_true", help="结束时在标准错误输出各阶段耗时与搜索计数")
+    parser.add_argument("--metrics-json", metavar="PATH", help="把各阶段耗时与搜索计数写入 JSON 文件")
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    with metrics.timer("catalog.load"):
+        courses = load_catalog(args.catalog)
+    if courses is None:
+        parser.error(f"无法读取课程数据: {args.catalog}")
+    
+    if args.batch:
+        if os.path.abspath(args.batch) == os.path.abspath(args.output):
+            parser.error("--output 不能与心愿单目录相同")
+        paths = sorted(glob.glob(os.path.join(args.batch, "*.json")))
+        if not paths:
+            parser.error(f"目录中没有心愿单: {args.batch}")
+        load_seconds = time.perf_counter() - start
+        students = solve_batch(courses, paths, args.output, args.limit, args.workers)
+        summary = {
+            "catalog": args.catalog,
+            "sections": len(courses),
+            "load_seconds": load_seconds,
+            "seconds": time.perf_counter() - start,
+            "solved": sum(1 for student in students if "error" not in student),
+            "failed": sum(1 for student in students if "error" in student),
+            "students": students,
+        }
+        with open(os.path.join(args.output, "summary.json"), 'w', encoding='utf-8') as f:
+            f.write(dumps(summary, ensure_ascii=False, indent=1))
+        print(dumps(summary, ensure_ascii=False, indent=1))
+        sys.exit(1 if summary["failed"] else 0)
+    
+    try:
+        wishlist, locked_slots, weights = load_wishlist(args.wishlist) if args.wishlist else ([], 0, None)
+        wishlist += args.course
+        if args.weights:
+            weights = parse_weights(args.weights)
+        elif args.rank and weights is None:
+            weights = dict(SCORE_WEIGHTS)
+        for text in args.lock:
+            locked_slots |= parse_lock(text)
+        sections = select_sections(CourseCatalog(courses), wishlist)
+    except (KeyError, ValueError) as e:
+        parser.error(e.args[0])
+    if not sections:
+        parser.error("心愿单为空，请指定心愿单文件或 --course")
+    
+    solver = ScheduleSolver.from_courses(sections, locked_slots)
+    # 最多课程数很快就能求出，先开始输出课程表，精确统计数量放在最后
+    summary = {"max_courses": solver.max_courses()}
+    if args.count_only:
+        records = iter(())
+    elif weights is not None:
+        summary["weights"] = weights
+        count = args.limit or solver.count_schedules()[1]
+        records = (ranked_record(score, schedule)
+                   for score, schedule in solver.top_schedules(summary["max_courses"], count, weights))
+    else:
+        records = map(schedule_record, solver.iter_schedules(summary["max_courses"], args.workers or 1))
+        if args.limit:
+            records = islice(records, args.limit)
+    
+    with metrics.timer("solver.enumerate"):
+        if args.format == "jsonl":
+            print(dumps(summary, ensure_ascii=False), flush=True)
+            for record in records:
+                print(dumps(record, ensure_ascii=False), flush=True)
+        else:
+            summary["results"] = list(records)
+    _, total, variants = solver.count_schedules()
+    counts = {"schedules": total, "teacher_variants": variants}
+    if args.format == "jsonl":
+        print(dumps(counts, ensure_ascii=False), flush=True)
+    else:
+        print(dumps({"max_courses": summary["max_courses"], **counts, **summary}, ensure_ascii=False, indent=1))
+    solver.record_metrics()
+    if args.metrics:
+        print(metrics.summary(), file=sys.stderr)
+    if args.metrics_json:
+        metrics.dump(args.metrics_json)
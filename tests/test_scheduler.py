@@ -0,0 +1,153 @@
+import os
+import random
+import sys
+import unittest
+from itertools import product
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import SCORE_WEIGHTS, ScheduleSession, ScheduleSolver, cell_mask, parse_schedule, schedule_score
+
+DAY_NAMES = ["星期一", "星期二", "星期三", "星期四", "星期五"]
+# 单双周、前后半学期的课程在同一单元格里并不冲突，暴力解只用整学期掩码判断
+WEEK_PATTERNS = ["1-16", "单1-15", "双2-16", "1-8", "9-16"]
+
+
+def random_courses(rnd, groups, sections):
+    courses = []
+    for group in range(groups):
+        for section in range(sections):
+            times = "".join(
+                f"<p>{rnd.choice(WEEK_PATTERNS)}周,{rnd.choice(DAY_NAMES[:3])}"
+                f"第{(start := rnd.choice([1, 3, 5]))}-{start + 1}节</p>"
+                for _ in range(rnd.randint(1, 2))
+            )
+            mask, time_text = parse_schedule(times)
+            courses.append([f"课程{group}", f"教师{section}", mask, time_text, "通识必修选课"])
+    return courses
+
+
+def schedule_key(schedule):
+    return frozenset((course[0], course[2]) for course in schedule)
+
+
+def occupied_slots(schedule):
+    mask = 0
+    for course in schedule:
+        mask |= course[2]
+    return mask
+
+
+def brute_force(solver):
+    # 每个课程组选一个班级或不选，保留两两不冲突且课程数最多的组合
+    options = [[None] + list(group) for group in solver.groups]
+    best = 0
+    found = []
+    for choice in product(*options):
+        picked = [i for i in choice if i is not None]
+        masks = [solver.sections[i][2] for i in picked]
+        if any(a & b for k, a in enumerate(masks) for b in masks[k + 1:]):
+            continue
+        if len(picked) > best:
+            best, found = len(picked), []
+        if len(picked) == best:
+            found.append([solver.sections[i] for i in picked])
+    # 一门课都选不上时求解器不返回空课程表
+    return best, found if best else []
+
+
+class ScheduleSolverTest(unittest.TestCase):
+    def test_iter_schedules_matches_brute_force(self):
+        rnd = random.Random(0)
+        for _ in range(30):
+            courses = random_courses(rnd, rnd.randint(2, 5), rnd.randint(1, 4))
+            solver = ScheduleSolver.from_courses(courses)
+            best, expected = brute_force(solver)
+            max_courses, total, _ = ScheduleSolver.from_courses(courses).count_schedules()
+            schedules = list(solver.iter_schedules(solver.max_courses()))
+            self.assertEqual(max_courses, best)
+            self.assertEqual(total, len(expected))
+            self.assertEqual(len(schedules), len(expected))
+            self.assertEqual({schedule_key(s) for s in schedules}, {schedule_key(s) for s in expected})
+
+    def test_top_schedules_matches_sorted_scores(self):
+        # 剪枝只在候选较多时才起作用，样本数比枚举测试多
+        rnd = random.Random(1)
+        for _ in range(200):
+            courses = random_courses(rnd, rnd.randint(2, 5), rnd.randint(1, 4))
+            weights = rnd.choice([SCORE_WEIGHTS, {name: rnd.randint(0, 3) for name in SCORE_WEIGHTS}])
+            count = rnd.randint(1, 6)
+            solver = ScheduleSolver.from_courses(courses)
+            best, expected = brute_force(solver)
+            scores = sorted(schedule_score(occupied_slots(s), weights) for s in expected)
+            top = solver.top_schedules(best, count, weights)
+            keys = {schedule_key(s) for s in expected}
+            self.assertEqual([score for score, _ in top], scores[:count])
+            for score, schedule in top:
+                self.assertIn(schedule_key(schedule), keys)
+                self.assertEqual(score, schedule_score(occupied_slots(schedule), weights))
+
+    def test_session_update_matches_full_solve(self):
+        rnd = random.Random(2)
+        incremental = 0
+        for _ in range(20):
+            catalog = random_courses(rnd, rnd.randint(3, 5), rnd.randint(1, 3))
+            selected = [c for c in catalog if rnd.random() < 0.7]
+            locked = 0
+            session = ScheduleSession()
+            solver = ScheduleSolver.from_courses(selected, locked)
+            session.store(solver, solver.max_courses(), list(solver.iter_schedules(solver.max_courses())))
+            for _ in range(10):
+                # 随机锁定、解锁时间或增删课程，覆盖 removed 与 added 两种键集合
+                cell = cell_mask(rnd.randrange(3), rnd.randrange(6))
+                op = rnd.choice(["lock", "unlock", "add", "remove"])
+                if op == "lock":
+                    locked |= cell
+                elif op == "unlock":
+                    locked &= ~cell
+                elif op == "add":
+                    selected.append(rnd.choice(catalog))
+                elif selected:
+                    selected.remove(rnd.choice(selected))
+                
+                solver = ScheduleSolver.from_courses(selected, locked)
+                max_courses = solver.max_courses()
+                best, expected = brute_force(ScheduleSolver.from_courses(selected, locked))
+                result = session.update(solver, locked, max_courses)
+                if result is None:
+                    # 交替使用直接保存和第一次更新时才枚举两种方式
+                    if rnd.random() < 0.5:
+                        session.store(solver, max_courses, list(solver.iter_schedules(max_courses)))
+                    else:
+                        session.defer(solver.copy(), max_courses)
+                    continue
+                incremental += 1
+                schedules, variants = result
+                teachers = {}
+                for course in selected:
+                    if not course[2] & locked:
+                        teachers.setdefault((course[0], course[2]), set()).add(course[1])
+                expected_variants = 0
+                for schedule in expected:
+                    ways = 1
+                    for course in schedule:
+                        ways *= len(teachers[course[0], course[2]])
+                    expected_variants += ways
+                self.assertEqual(max_courses, best)
+                self.assertEqual(len(schedules), len(expected))
+                self.assertEqual({schedule_key(s) for s in schedules}, {schedule_key(s) for s in expected})
+                self.assertEqual(variants, expected_variants)
+        self.assertGreater(incremental, 0)
+
+    def test_alternating_weeks_share_a_cell(self):
+        odd, _ = parse_schedule("<p>单1-15周,星期一第1-2节</p>")
+        even, _ = parse_schedule("<p>双2-16周,星期一第1-2节</p>")
+        every, _ = parse_schedule("<p>1-16周,星期一第1-2节</p>")
+        courses = [["A", "甲", odd, "", ""], ["B", "乙", even, "", ""], ["C", "丙", every, "", ""]]
+        solver = ScheduleSolver.from_courses(courses)
+        schedules = list(solver.iter_schedules(solver.max_courses()))
+        self.assertEqual([schedule_key(s) for s in schedules], [frozenset({("A", odd), ("B", even)})])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import argparse
+import random
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from json import loads, dumps
+from urllib.parse import urlsplit, parse_qs
+
+# 本地替身服务器: 模拟 cas 登录流程与 tis 的 Xsxk 接口，数据来自 main.py --record 录制的
+# 课程数据文件或随机生成，配合 main.py --base-url http://127.0.0.1:8765 使用
+
+COURSE_TYPES = ["bxxk", "xxxk", "kzyxk", "zynknjxk", "jhnxk"]
+DAYS = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+WEEK_PATTERNS = ["1-16", "1-16", "1-16", "单1-15", "双2-16", "1-8", "9-16"]
+PERIOD_PATTERNS = ["1-2", "3-4", "5-6", "7-8", "9-10", "9-11", "3-5"]
+NAME_PARTS = ["高等数学", "线性代数", "大学物理", "程序设计", "数据结构", "概率论", "电路基础",
+              "有机化学", "细胞生物学", "英语写作", "中国近现代史纲要", "体育", "机器学习", "数字逻辑"]
+TEACHERS = ["张伟", "王芳", "李娜", "刘洋", "陈静", "杨磊", "赵强", "黄敏", "周杰", "吴婷"]
+
+
+def synthetic_fixture(courses, seed=0):
+    rnd = random.Random(seed)
+    kxrw = {course_type: [] for course_type in COURSE_TYPES}
+    count = 0
+    while count < courses:
+        name = f"{rnd.choice(NAME_PARTS)}{rnd.choice(['A', 'B', 'I', 'II', '（上）', '（下）', ''])}"
+        course_type = rnd.choice(COURSE_TYPES)
+        for _ in range(min(rnd.randint(1, 6), courses - count)):
+            times = "".join(
+                f"<p>{rnd.choice(WEEK_PATTERNS)}周,{rnd.choice(DAYS[:5] if rnd.random() < 0.9 else DAYS)}"
+                f"第{rnd.choice(PERIOD_PATTERNS)}节</p><p>荔园{rnd.randint(1, 8)}栋{rnd.randint(101, 520)}</p>"
+                for _ in range(rnd.randint(1, 3))
+            )
+            kxrw[course_type].append({
+                "kcmc": name,
+                "dgjsmc": rnd.choice(TEACHERS),
+                "kcxx": times,
+            })
+            count += 1
+    return {
+        "semester": {"p_xn": "2099-2100", "p_xq": "1", "p_xnxq": "standin"},
+        "kxrw": kxrw,
+    }
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    fixture = None
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type="application/json;charset=UTF-8", headers=()):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers:
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_form(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        return {key: values[0] for key, values in form.items()}
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlsplit(self.path)
+        if url.path == "/cas/login":
+            self.send_body(200, '<input type="hidden" name="execution" value="standin-execution"/>',
+                           "text/html;charset=UTF-8")
+        elif url.path == "/cas":
+            self.send_body(302, "", headers=[
+                ("Location", "/"),
+                ("Set-Cookie", "route=standin-route; Path=/"),
+                ("Set-Cookie", "JSESSIONID=standin-session; Path=/"),
+            ])
+        else:
+            self.send_body(404, "{}")
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        url = urlsplit(self.path)
+        form = self.read_form()
+        if url.path == "/cas/login":
+            if form.get("username") and form.get("password") and form.get("execution") == "standin-execution":
+                host = self.headers.get("Host")
+                self.send_body(302, "", headers=[("Location", f"http://{host}/cas?ticket=ST-standin")])
+            else:
+                self.send_body(200, "<p>用户名或密码错误</p>", "text/html;charset=UTF-8")
+        elif url.path == "/Xsxk/queryXkdqXnxq":
+            self.send_body(200, dumps(self.fixture["semester"], ensure_ascii=False))
+        elif url.path == "/Xsxk/queryKxrw":
+            items = self.fixture["kxrw"].get(form.get("p_xkfsdm"), [])
+            page = int(form.get("pageNum", 1))
+            page_size = int(form.get("pageSize", 1000))
+            start = (page - 1) * page_size
+            self.send_body(200, dumps({"kxrwList": {
+                "list": items[start:start + page_size],
+                "total": len(items),
+                "pages": -(-len(items) // page_size),
+                "pageNum": page,
+                "pageSize": page_size,
+            }}, ensure_ascii=False))
+        else:
+            self.send_body(404, "{}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cas/tis 本地替身服务器")
+    parser.add_argument("fixture", nargs="?", help="main.py --record 录制的课程数据文件")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="不读取文件，随机生成 N 个课程班级")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", metavar="PATH", help="把随机生成的课程数据另存为文件")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求额外等待的秒数，用于模拟选课高峰")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        fixture = synthetic_fixture(args.synthetic, args.seed)
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                f.write(dumps(fixture, ensure_ascii=False, indent=1))
+    elif args.fixture:
+        with open(args.fixture, encoding="utf-8") as f:
+            fixture = loads(f.read())
+    else:
+        parser.error("请指定课程数据文件或 --synthetic")
+
+    StandinHandler.fixture = fixture
+    StandinHandler.latency = args.latency
+    server = ThreadingHTTPServer((args.host, args.port), StandinHandler)
+    print(f"替身服务器已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()